@@ -22,6 +22,7 @@
     'depends': [
         'hr_contract',
         'hr_holidays',
+        'hr_attendance',
         'hr' 
     ],
     'data': [
@@ -31,10 +32,15 @@
         'views/hr_contract_views.xml',
         'views/hr_salary_rule_views.xml',
         'views/hr_payslip_views.xml',
+        'views/hr_payroll_summary_views.xml',
+        'views/hr_payroll_ytd_views.xml',
+        'views/hr_tax_bracket_views.xml',
         'views/hr_employee_views.xml',
         'data/hr_payroll_sequence.xml',
         'views/hr_payroll_report.xml',
         'data/hr_payroll_data.xml',
+        'data/hr_tax_bracket_data.xml',
+        'data/hr_payroll_cron.xml',
         'wizard/hr_payroll_contribution_register_report_views.xml',
         'views/res_config_settings_views.xml',
         'views/report_contributionregister_templates.xml',
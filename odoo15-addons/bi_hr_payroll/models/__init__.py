@@ -5,4 +5,7 @@ from . import hr_contract
 from . import hr_employee
 from . import res_config_settings
 from . import hr_salary_rule
+from . import hr_tax_bracket
 from . import hr_payslip
+from . import hr_payroll_summary
+from . import hr_payroll_ytd
@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 # Part of BrowseInfo. See LICENSE file for full copyright and licensing details.
 
-from odoo import api, fields, models
+from odoo import api, fields, models, tools
 
 
 class HrContract(models.Model):
@@ -24,6 +24,13 @@ class HrContract(models.Model):
     ], string='Scheduled Pay', index=True, default='monthly',
     help="Defines the frequency of the wage payment.")
     resource_calendar_id = fields.Many2one(required=True, help="Employee's working schedule.")
+    ptkp_id = fields.Many2one('hr.ptkp', string='PTKP Status',
+        help="Non taxable income status of the employee, given to the salary rules by brackets.ptkp(contract)")
+
+    def init(self):
+        # resolution of the contracts of the employees valid within a payslip period
+        tools.create_index(self._cr, 'hr_contract_employee_state_dates_index',
+                           self._table, ['employee_id', 'state', 'date_start', 'date_end'])
 
     def get_all_structures(self):
         """
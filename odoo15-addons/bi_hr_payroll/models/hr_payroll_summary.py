@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+# Part of BrowseInfo. See LICENSE file for full copyright and licensing details.
+
+from odoo import api, fields, models, tools
+
+
+class HrPayrollSummary(models.Model):
+    """
+    Signed totals of the lines of the done payslips, by employee, contract, period, salary rule,
+    code, category and contribution register. Credit notes count negatively. The table is maintained when payslips are confirmed or
+    set back to draft, and can be rebuilt from the payslip lines at any time.
+    """
+    _name = 'hr.payroll.summary'
+    _description = 'Payroll Summary'
+    _order = 'date_from desc, employee_id, contract_id, code'
+
+    employee_id = fields.Many2one('hr.employee', string='Employee', required=True, readonly=True, index=True)
+    contract_id = fields.Many2one('hr.contract', string='Contract', required=True, readonly=True)
+    date_from = fields.Date(string='Date From', required=True, readonly=True, index=True)
+    date_to = fields.Date(string='Date To', required=True, readonly=True)
+    salary_rule_id = fields.Many2one('hr.salary.rule', string='Rule', required=True, readonly=True)
+    code = fields.Char(required=True, readonly=True, index=True)
+    category_id = fields.Many2one('hr.salary.rule.category', string='Category', readonly=True, index=True)
+    register_id = fields.Many2one('hr.contribution.register', string='Contribution Register', readonly=True, index=True)
+    line_count = fields.Integer(string='Lines', readonly=True)
+    total = fields.Float(digits='Payroll', readonly=True)
+
+    def init(self):
+        # a single row by key, the lines without category or register sharing theirs
+        tools.create_unique_index(self._cr, 'hr_payroll_summary_key_uniq', self._table, [
+            'employee_id', 'contract_id', 'date_from', 'date_to', 'salary_rule_id', 'code',
+            'COALESCE(category_id, 0)', 'COALESCE(register_id, 0)'])
+        # summarize the payslips confirmed before the summary existed
+        self.env.cr.execute("SELECT 1 FROM hr_payroll_summary LIMIT 1")
+        if not self.env.cr.fetchone():
+            self._rebuild()
+
+    def _upsert(self, where, params, sign=1):
+        """ Add (or subtract, with a negative sign) the lines of the done payslips matching ``where`` """
+        self.env['hr.payslip'].flush(['employee_id', 'date_from', 'date_to', 'state', 'credit_note'])
+        self.env['hr.payslip.line'].flush(['slip_id', 'contract_id', 'salary_rule_id', 'code', 'category_id', 'register_id', 'total'])
+        self.flush()
+        self.env.cr.execute("""
+            INSERT INTO hr_payroll_summary (employee_id, contract_id, date_from, date_to, salary_rule_id,
+                code, category_id, register_id, line_count, total,
+                create_uid, create_date, write_uid, write_date)
+            SELECT hp.employee_id, pl.contract_id, hp.date_from, hp.date_to, pl.salary_rule_id,
+                pl.code, pl.category_id, pl.register_id, %%(sign)s * count(pl.id),
+                %%(sign)s * sum(case when hp.credit_note = False then (pl.total) else (-pl.total) end),
+                %%(uid)s, (now() at time zone 'UTC'), %%(uid)s, (now() at time zone 'UTC')
+            FROM hr_payslip as hp, hr_payslip_line as pl
+            WHERE hp.id = pl.slip_id AND hp.state = 'done' AND %s
+            GROUP BY hp.employee_id, pl.contract_id, hp.date_from, hp.date_to, pl.salary_rule_id,
+                pl.code, pl.category_id, pl.register_id
+            ON CONFLICT (employee_id, contract_id, date_from, date_to, salary_rule_id, code,
+                COALESCE(category_id, 0), COALESCE(register_id, 0)) DO UPDATE
+            SET line_count = hr_payroll_summary.line_count + EXCLUDED.line_count,
+                total = hr_payroll_summary.total + EXCLUDED.total,
+                write_uid = EXCLUDED.write_uid, write_date = EXCLUDED.write_date""" % where,
+            dict(params, sign=sign, uid=self.env.uid))
+        self.env.cr.execute("DELETE FROM hr_payroll_summary WHERE line_count <= 0")
+        self.invalidate_cache()
+
+    @api.model
+    def _add_payslips(self, payslips):
+        """ Add the lines of the given done payslips to the summary """
+        if payslips:
+            self._upsert("hp.id IN %(ids)s", {'ids': tuple(payslips.ids)})
+
+    @api.model
+    def _remove_payslips(self, payslips):
+        """ Remove the lines of the given done payslips from the summary, before they leave the done state """
+        if payslips:
+            self._upsert("hp.id IN %(ids)s", {'ids': tuple(payslips.ids)}, sign=-1)
+
+    @api.model
+    def _rebuild(self):
+        """ Rebuild the whole summary from the lines of the done payslips """
+        self.env.cr.execute("DELETE FROM hr_payroll_summary")
+        self._upsert("TRUE", {})
+        return True
+
+    @api.model
+    def _read_totals(self, groupby, domain_sql, params):
+        """
+        @param groupby: the summary columns to group the totals by
+        @param domain_sql: an SQL condition on the summary rows (aliased ``s``)
+        @return: a list of tuples (*groupby values, line count, total)
+        """
+        self.flush()
+        columns = ", ".join("s.%s" % fname for fname in groupby)
+        self.env.cr.execute("""
+            SELECT %s, sum(s.line_count), sum(s.total) FROM hr_payroll_summary AS s
+            WHERE %s
+            GROUP BY %s""" % (columns, domain_sql, columns), params)
+        return self.env.cr.fetchall()
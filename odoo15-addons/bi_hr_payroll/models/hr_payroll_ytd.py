@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+# Part of BrowseInfo. See LICENSE file for full copyright and licensing details.
+
+from collections import defaultdict
+
+from odoo import api, fields, models
+
+
+class HrPayrollYtd(models.Model):
+    """
+    Year to date ledger: signed totals of the lines of the done payslips of each employee, by
+    year of the end of the payslip period and by rule code or category code (a line counting
+    for its category and all the parents of the category, as in the ``categories`` of the
+    rules). Maintained when payslips are confirmed or set back to draft, and rebuildable.
+    """
+    _name = 'hr.payroll.ytd'
+    _description = 'Payroll Year to Date Ledger'
+    _order = 'year desc, employee_id, kind, code'
+
+    employee_id = fields.Many2one('hr.employee', string='Employee', required=True, readonly=True, index=True)
+    year = fields.Integer(required=True, readonly=True, index=True)
+    kind = fields.Selection([
+        ('rule', 'Rule'),
+        ('category', 'Category'),
+    ], required=True, readonly=True)
+    code = fields.Char(required=True, readonly=True)
+    payslip_count = fields.Integer(string='Payslips', readonly=True,
+        help="Number of done payslips with lines of this code, credit notes counting negatively")
+    total = fields.Float(digits='Payroll', readonly=True)
+
+    _sql_constraints = [
+        ('employee_year_code_uniq', 'unique(employee_id, year, kind, code)',
+         'The ledger holds a single row by employee, year and code.'),
+    ]
+
+    def init(self):
+        # record the payslips confirmed before the ledger existed
+        self.env.cr.execute("SELECT 1 FROM hr_payroll_ytd LIMIT 1")
+        if not self.env.cr.fetchone():
+            self._rebuild()
+
+    def _upsert(self, where, params, sign=1):
+        """ Add (or subtract, with a negative sign) the lines of the done payslips matching ``where`` """
+        self.env['hr.payslip'].flush(['employee_id', 'date_to', 'state', 'credit_note'])
+        self.env['hr.payslip.line'].flush(['slip_id', 'code', 'category_id', 'total'])
+        self.env['hr.salary.rule.category'].flush(['code', 'parent_id'])
+        self.flush()
+        self.env.cr.execute("""
+            WITH lines AS (
+                SELECT hp.id AS slip_id, hp.employee_id, date_part('year', hp.date_to)::integer AS year,
+                    hp.credit_note, pl.code, pl.category_id,
+                    case when hp.credit_note = False then (pl.total) else (-pl.total) end AS total
+                FROM hr_payslip as hp, hr_payslip_line as pl
+                WHERE hp.id = pl.slip_id AND hp.state = 'done' AND %s
+            ), entries AS (
+                SELECT slip_id, employee_id, year, credit_note, 'rule' AS kind, code, total FROM lines
+                UNION ALL
+                SELECT l.slip_id, l.employee_id, l.year, l.credit_note, 'category', rc.code, l.total
+                FROM lines AS l
+                JOIN hr_salary_rule_category_ancestor AS ca ON (ca.category_id = l.category_id)
+                JOIN hr_salary_rule_category AS rc ON (rc.id = ca.ancestor_id)
+            )
+            INSERT INTO hr_payroll_ytd (employee_id, year, kind, code, payslip_count, total,
+                create_uid, create_date, write_uid, write_date)
+            SELECT employee_id, year, kind, code,
+                %%(sign)s * (count(DISTINCT slip_id) FILTER (WHERE NOT credit_note)
+                             - count(DISTINCT slip_id) FILTER (WHERE credit_note)),
+                %%(sign)s * sum(total),
+                %%(uid)s, (now() at time zone 'UTC'), %%(uid)s, (now() at time zone 'UTC')
+            FROM entries
+            GROUP BY employee_id, year, kind, code
+            ON CONFLICT (employee_id, year, kind, code) DO UPDATE
+            SET payslip_count = hr_payroll_ytd.payslip_count + EXCLUDED.payslip_count,
+                total = hr_payroll_ytd.total + EXCLUDED.total,
+                write_uid = EXCLUDED.write_uid, write_date = EXCLUDED.write_date""" % where,
+            dict(params, sign=sign, uid=self.env.uid))
+        self.env.cr.execute("DELETE FROM hr_payroll_ytd WHERE payslip_count = 0 AND total = 0")
+        self.invalidate_cache()
+
+    @api.model
+    def _add_payslips(self, payslips):
+        """ Add the lines of the given done payslips to the ledger """
+        if payslips:
+            self._upsert("hp.id IN %(ids)s", {'ids': tuple(payslips.ids)})
+
+    @api.model
+    def _remove_payslips(self, payslips):
+        """ Remove the lines of the given done payslips from the ledger, before they leave the done state """
+        if payslips:
+            self._upsert("hp.id IN %(ids)s", {'ids': tuple(payslips.ids)}, sign=-1)
+
+    @api.model
+    def _rebuild(self):
+        """ Rebuild the whole ledger from the lines of the done payslips """
+        self.env.cr.execute("DELETE FROM hr_payroll_ytd")
+        self._upsert("TRUE", {})
+        return True
+
+    @api.model
+    def _get_ledger(self, employee_ids, years):
+        """
+        @return: a dict {(employee_id, year): {kind: {code: (total, payslip_count)}}} of the given
+                 employees and years, read with a single query
+        """
+        ledger = defaultdict(lambda: {'rule': {}, 'category': {}})
+        if not employee_ids or not years:
+            return ledger
+        self.flush()
+        self.env.cr.execute("""
+            SELECT employee_id, year, kind, code, total, payslip_count FROM hr_payroll_ytd
+            WHERE employee_id IN %s AND year IN %s""",
+            (tuple(employee_ids), tuple(years)))
+        for employee_id, year, kind, code, total, payslip_count in self.env.cr.fetchall():
+            ledger[(employee_id, year)][kind][code] = (total, payslip_count)
+        return ledger
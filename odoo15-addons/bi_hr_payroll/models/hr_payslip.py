@@ -2,13 +2,358 @@
 # Part of BrowseInfo. See LICENSE file for full copyright and licensing details.
 
 import babel
-import pytz
+import hashlib
+import json
+import logging
+import multiprocessing
+import threading
+import time as time_module
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from datetime import date, datetime, time, timedelta
 from dateutil.relativedelta import relativedelta
-from pytz import timezone
+from pytz import timezone, utc
 from odoo.tools import DEFAULT_SERVER_DATE_FORMAT as default
-from odoo import api, fields, models, tools, _
+import odoo
+from odoo import api, fields, models, sql_db, tools, _
 from odoo.exceptions import UserError, ValidationError
+from odoo.tools.safe_eval import safe_eval
+from .hr_rule_engine import VectorFallback, eval_vector_expression, make_rule_namespace, numpy
+from .hr_salary_rule import _eval_compiled
+from .hr_tax_bracket import TaxBrackets
+
+_logger = logging.getLogger(__name__)
+
+# timezone of the attendance days, and worked days code under which they are given to the rules
+ATTENDANCE_TZ = 'Asia/Jakarta'
+ATTENDANCE_CODE = 'HADIR'
+
+# types of the contract and employee fields whose values are given to the rules as read
+RULE_VALUE_FIELD_TYPES = ('boolean', 'integer', 'float', 'monetary', 'char', 'text', 'selection', 'date', 'datetime')
+
+
+class PayslipHistory(object):
+    """
+    Totals of the done payslips of a set of employees over a period, used to answer the ``sum()``
+    helpers of the salary rules from memory. The totals are loaded by a few grouped queries the
+    first time they are needed; the helpers fall back to SQL for periods outside the prefetched one.
+    """
+    def __init__(self, env, employee_ids, date_from, date_to):
+        self.env = env
+        self.employee_ids = frozenset(employee_ids)
+        self.date_from = fields.Date.to_date(date_from)
+        self.date_to = fields.Date.to_date(date_to)
+        self.loaded = False
+        self.inputs = defaultdict(list)
+        self.worked_days = defaultdict(list)
+        self.lines = defaultdict(list)
+
+    def _load(self):
+        """ Prefetch the totals by (employee, payslip period, code) """
+        self.loaded = True
+        if not self.employee_ids:
+            return
+        params = (tuple(self.employee_ids), self.date_from, self.date_to)
+        self.env.cr.execute("""
+            SELECT hp.employee_id, hp.date_from, hp.date_to, pi.code, sum(pi.amount)
+            FROM hr_payslip as hp, hr_payslip_input as pi
+            WHERE hp.employee_id IN %s AND hp.state = 'done'
+            AND hp.date_from >= %s AND hp.date_to <= %s AND hp.id = pi.payslip_id
+            GROUP BY hp.employee_id, hp.date_from, hp.date_to, pi.code""", params)
+        for employee_id, date_from, date_to, code, amount in self.env.cr.fetchall():
+            self.inputs[(employee_id, code)].append((date_from, date_to, amount))
+        self.env.cr.execute("""
+            SELECT hp.employee_id, hp.date_from, hp.date_to, pi.code, sum(pi.number_of_days), sum(pi.number_of_hours)
+            FROM hr_payslip as hp, hr_payslip_worked_days as pi
+            WHERE hp.employee_id IN %s AND hp.state = 'done'
+            AND hp.date_from >= %s AND hp.date_to <= %s AND hp.id = pi.payslip_id
+            GROUP BY hp.employee_id, hp.date_from, hp.date_to, pi.code""", params)
+        for employee_id, date_from, date_to, code, days, hours in self.env.cr.fetchall():
+            self.worked_days[(employee_id, code)].append((date_from, date_to, (days, hours)))
+        totals = self.env['hr.payroll.summary']._read_totals(
+            ['employee_id', 'date_from', 'date_to', 'code'],
+            "s.employee_id IN %s AND s.date_from >= %s AND s.date_to <= %s", params)
+        for employee_id, date_from, date_to, code, count, total in totals:
+            self.lines[(employee_id, code)].append((date_from, date_to, total))
+
+    def _get_rows(self, totals, employee_id, code, from_date, to_date):
+        """
+        @return: the prefetched totals of the payslips of the employee within the given dates,
+                 or None if they were not prefetched
+        """
+        if employee_id not in self.employee_ids:
+            return None
+        try:
+            from_date = fields.Date.to_date(from_date)
+            to_date = fields.Date.to_date(to_date)
+        except (TypeError, ValueError):
+            return None
+        if not from_date or not to_date or from_date < self.date_from or to_date > self.date_to:
+            return None
+        if not self.loaded:
+            self._load()
+        return [value for date_from, date_to, value in totals.get((employee_id, code), [])
+                if date_from >= from_date and date_to <= to_date]
+
+    def sum_inputs(self, employee_id, code, from_date, to_date):
+        rows = self._get_rows(self.inputs, employee_id, code, from_date, to_date)
+        return rows if rows is None else sum(amount or 0.0 for amount in rows)
+
+    def sum_worked_days(self, employee_id, code, from_date, to_date):
+        rows = self._get_rows(self.worked_days, employee_id, code, from_date, to_date)
+        if rows is None:
+            return None
+        if not rows:
+            return (None, None)
+        return (sum(days or 0.0 for days, hours in rows), sum(hours or 0.0 for days, hours in rows))
+
+    def sum_lines(self, employee_id, code, from_date, to_date):
+        rows = self._get_rows(self.lines, employee_id, code, from_date, to_date)
+        return rows if rows is None else sum(total or 0.0 for total in rows)
+
+
+class WorkedDaysBatch(object):
+    """
+    Worked days of many contracts over a period. The work days data and the leaves of the
+    employees sharing a working schedule are computed in one batch per schedule, and the work
+    hours of each day of a schedule are only computed once.
+    """
+
+    def __init__(self, env, contracts, date_from, date_to):
+        self.env = env
+        self.contracts = contracts.filtered(lambda contract: contract.resource_calendar_id)
+        self.date_from = fields.Date.to_date(date_from)
+        self.date_to = fields.Date.to_date(date_to)
+        self.day_from = datetime.combine(self.date_from, time.min)
+        self.day_to = datetime.combine(self.date_to, time.max)
+        self._work_data = None
+        self._leaves = None
+        self._work_hours = {}
+
+    def _load(self):
+        self._work_data = {}
+        self._leaves = {}
+        employees_by_calendar = defaultdict(lambda: self.env['hr.employee'])
+        for contract in self.contracts:
+            employees_by_calendar[contract.resource_calendar_id] |= contract.employee_id
+        # naive datetimes are explicit in UTC, as in resource.mixin.list_leaves
+        start_dt = self.day_from.replace(tzinfo=utc)
+        end_dt = self.day_to.replace(tzinfo=utc)
+        for calendar, employees in employees_by_calendar.items():
+            work_data = employees._get_work_days_data_batch(self.day_from, self.day_to, calendar=calendar)
+            resources = employees.mapped('resource_id')
+            attendances = calendar._attendance_intervals_batch(start_dt, end_dt, resources)
+            leaves = calendar._leave_intervals_batch(start_dt, end_dt, resources)
+            for employee in employees:
+                resource_id = employee.resource_id.id
+                self._work_data[(calendar.id, employee.id)] = work_data[employee.id]
+                self._leaves[(calendar.id, employee.id)] = [
+                    (start.date(), (stop - start).total_seconds() / 3600, leave)
+                    for start, stop, leave in (leaves[resource_id] & attendances[resource_id])
+                ]
+
+    def get_work_hours(self, calendar, day):
+        """ @return: the hours of the working schedule on the given day, regardless of the leaves """
+        key = (calendar.id, day)
+        if key not in self._work_hours:
+            tz = timezone(calendar.tz)
+            self._work_hours[key] = calendar.get_work_hours_count(
+                tz.localize(datetime.combine(day, time.min)),
+                tz.localize(datetime.combine(day, time.max)),
+                compute_leaves=False,
+            )
+        return self._work_hours[key]
+
+    def get_lines(self, contracts):
+        """ @return: the worked days lines values of the given contracts (see get_worked_day_lines) """
+        if self._work_data is None:
+            self._load()
+        res = []
+        # fill only if the contract as a working schedule linked
+        for contract in contracts.filtered(lambda contract: contract.resource_calendar_id):
+            calendar = contract.resource_calendar_id
+            key = (calendar.id, contract.employee_id.id)
+
+            # compute leave days
+            leaves = {}
+            for day, hours, leave in self._leaves[key]:
+                holiday = leave[:1].holiday_id
+                current_leave_struct = leaves.setdefault(holiday.holiday_status_id, {
+                    'name': holiday.holiday_status_id.name or _('Global Leaves'),
+                    'sequence': 5,
+                    'code': holiday.holiday_status_id.name or 'GLOBAL',
+                    'number_of_days': 0.0,
+                    'number_of_hours': 0.0,
+                    'contract_id': contract.id,
+                })
+                current_leave_struct['number_of_hours'] += hours
+                work_hours = self.get_work_hours(calendar, day)
+                if work_hours:
+                    current_leave_struct['number_of_days'] += hours / work_hours
+
+            # compute worked days
+            work_data = self._work_data[key]
+            attendances = {
+                'name': _("Normal Working Days paid at 100%"),
+                'sequence': 1,
+                'code': 'WORK100',
+                'number_of_days': work_data['days'],
+                'number_of_hours': work_data['hours'],
+                'contract_id': contract.id,
+            }
+
+            res.append(attendances)
+            res.extend(leaves.values())
+        return res
+
+
+# connection pools inherited from the parent by the processes computing payslip batch chunks
+_inherited_pools = []
+
+
+def _init_payslip_run_process():
+    """
+    Initializer of the processes computing payslip batch chunks: the connections of the forked
+    parent stay in use by the parent, they must neither be used nor closed by the child.
+    """
+    _inherited_pools.append(sql_db._Pool)
+    sql_db._Pool = None
+
+
+def _run_payslip_run_chunk(dbname, uid, context, chunk_id):
+    """ Compute a payslip batch chunk in its own cursor, from a child process """
+    registry = odoo.registry(dbname)
+    registry._db = sql_db.db_connect(dbname)
+    threading.current_thread().dbname = dbname
+    with registry.cursor() as cr:
+        env = api.Environment(cr, uid, context)
+        env['hr.payslip.run.chunk'].browse(chunk_id)._run()
+    return chunk_id
+
+
+class WorkedDaysValue(object):
+    """ worked days computed by the engine, given to the rules like a hr.payslip.worked_days line """
+    __slots__ = ('code', 'name', 'number_of_days', 'number_of_hours')
+
+    def __init__(self, code, name, number_of_days, number_of_hours):
+        self.code = code
+        self.name = name
+        self.number_of_days = number_of_days
+        self.number_of_hours = number_of_hours
+
+
+class RecordValues(object):
+    """
+    Contract or employee given to the rules, holding the values of the fields the rules read,
+    read for the whole computation at once. Any other attribute is read on the record.
+    """
+    __slots__ = ('_record', '_values')
+
+    def __init__(self, record, values):
+        self._record = record
+        self._values = values
+
+    def __getattr__(self, attr):
+        if attr in self._values:
+            return self._values[attr]
+        return getattr(self._record, attr)
+
+    def __getitem__(self, key):
+        if key in self._values:
+            return self._values[key]
+        return self._record[key]
+
+    def __eq__(self, other):
+        return self._record == getattr(other, '_record', other)
+
+    def __hash__(self):
+        return hash(self._record)
+
+
+class BrowsableObject(object):
+    def __init__(self, employee_id, dict, env, history=None):
+        self.employee_id = employee_id
+        self.dict = dict
+        self.env = env
+        self.history = history
+
+    def __getattr__(self, attr):
+        return attr in self.dict and self.dict.__getitem__(attr) or 0.0
+
+
+class InputLine(BrowsableObject):
+    """a class that will be used into the python code, mainly for usability purposes"""
+    def sum(self, code, from_date, to_date=None):
+        if to_date is None:
+            to_date = fields.Date.today()
+        res = self.history and self.history.sum_inputs(self.employee_id, code, from_date, to_date)
+        if res is not None:
+            return res
+        self.env.cr.execute("""
+            SELECT sum(amount) as sum
+            FROM hr_payslip as hp, hr_payslip_input as pi
+            WHERE hp.employee_id = %s AND hp.state = 'done'
+            AND hp.date_from >= %s AND hp.date_to <= %s AND hp.id = pi.payslip_id AND pi.code = %s""",
+            (self.employee_id, from_date, to_date, code))
+        return self.env.cr.fetchone()[0] or 0.0
+
+
+class WorkedDays(BrowsableObject):
+    """a class that will be used into the python code, mainly for usability purposes"""
+    def _sum(self, code, from_date, to_date=None):
+        if to_date is None:
+            to_date = fields.Date.today()
+        res = self.history and self.history.sum_worked_days(self.employee_id, code, from_date, to_date)
+        if res is not None:
+            return res
+        self.env.cr.execute("""
+            SELECT sum(number_of_days) as number_of_days, sum(number_of_hours) as number_of_hours
+            FROM hr_payslip as hp, hr_payslip_worked_days as pi
+            WHERE hp.employee_id = %s AND hp.state = 'done'
+            AND hp.date_from >= %s AND hp.date_to <= %s AND hp.id = pi.payslip_id AND pi.code = %s""",
+            (self.employee_id, from_date, to_date, code))
+        return self.env.cr.fetchone()
+
+    def sum(self, code, from_date, to_date=None):
+        res = self._sum(code, from_date, to_date)
+        return res and res[0] or 0.0
+
+    def sum_hours(self, code, from_date, to_date=None):
+        res = self._sum(code, from_date, to_date)
+        return res and res[1] or 0.0
+
+
+class Payslips(BrowsableObject):
+    """a class that will be used into the python code, mainly for usability purposes"""
+
+    def sum(self, code, from_date, to_date=None):
+        if to_date is None:
+            to_date = fields.Date.today()
+        res = self.history and self.history.sum_lines(self.employee_id, code, from_date, to_date)
+        if res is not None:
+            return res
+        res = self.env['hr.payroll.summary']._read_totals(
+            ['employee_id'], "s.employee_id = %s AND s.date_from >= %s AND s.date_to <= %s AND s.code = %s",
+            (self.employee_id, from_date, to_date, code))
+        return res and res[0][2] or 0.0
+
+
+class YearToDate(BrowsableObject):
+    """
+    Year to date totals of the done payslips of the employee, in the year of the end of the
+    payslip period: ``ytd.BASIC`` for a rule code, ``ytd.category('ALW')`` for a category code
+    """
+
+    def category(self, code):
+        return self.dict['category'].get(code, (0.0, 0))[0]
+
+    def count(self, code):
+        """ @return: the number of done payslips of the year with a line of the given rule code """
+        return self.dict['rule'].get(code, (0.0, 0))[1]
+
+    def __getattr__(self, attr):
+        return self.dict['rule'].get(attr, (0.0, 0))[0]
+
 
 class HrPayslip(models.Model):
     _name = 'hr.payslip'
@@ -65,6 +410,11 @@ class HrPayslip(models.Model):
     payslip_run_id = fields.Many2one('hr.payslip.run', string='Payslip Batches', readonly=True,
         copy=False, states={'draft': [('readonly', False)]})
     payslip_count = fields.Integer(compute='_compute_payslip_count', string="Payslip Computation Details")
+    compute_fingerprint = fields.Char(readonly=True, copy=False,
+        help="Digest of the data the lines were computed from, but the inputs. The payslip is only computed again when it changes.")
+    compute_state = fields.Text(readonly=True, copy=False,
+        help="Inputs and exact results of the rules of the last computation, to only evaluate again "
+             "the rules depending on the inputs which changed since")
 
     def _compute_details_by_salary_rule_category(self):
         for payslip in self:
@@ -99,12 +449,19 @@ class HrPayslip(models.Model):
         return rec
 
     def action_payslip_draft(self):
+        done_payslips = self.filtered(lambda slip: slip.state == 'done')
+        self.env['hr.payroll.summary']._remove_payslips(done_payslips)
+        self.env['hr.payroll.ytd']._remove_payslips(done_payslips)
         return self.write({'state': 'draft'})
 
     def action_payslip_done(self):
         if not self.env.context.get('without_compute_sheet'):
             self.compute_sheet()
-        return self.write({'state': 'done'})
+        payslips = self.filtered(lambda slip: slip.state != 'done')
+        res = self.write({'state': 'done'})
+        self.env['hr.payroll.summary']._add_payslips(payslips)
+        self.env['hr.payroll.ytd']._add_payslips(payslips)
+        return res
 
     def action_payslip_cancel(self):
         if self.filtered(lambda slip: slip.state == 'done'):
@@ -143,14 +500,27 @@ class HrPayslip(models.Model):
     # TODO move this function into hr_contract module, on hr.employee object
     @api.model
     def get_contract(self, employee, date_from, date_to):
+        return self.get_contracts(employee, date_from, date_to).get(employee.id, [])
+
+    @api.model
+    def get_contracts(self, employees, date_from, date_to):
+        """
+        @return: a dict {employee_id: ids of the open contracts valid within the period} of the
+                 given employees, resolved with a single query
+        """
+        if not employees:
+            return {}
         # a contract is valid if it ends between the given dates
         clause_1 = ['&', ('date_end', '<=', date_to), ('date_end', '>=', date_from)]
         # OR if it starts between the given dates
         clause_2 = ['&', ('date_start', '<=', date_to), ('date_start', '>=', date_from)]
         # OR if it starts before the date_from and finish after the date_end (or never finish)
         clause_3 = ['&', ('date_start', '<=', date_from), '|', ('date_end', '=', False), ('date_end', '>=', date_to)]
-        clause_final = [('employee_id', '=', employee.id), ('state', '=', 'open'), '|', '|'] + clause_1 + clause_2 + clause_3
-        return self.env['hr.contract'].search(clause_final).ids
+        clause_final = [('employee_id', 'in', employees.ids), ('state', '=', 'open'), '|', '|'] + clause_1 + clause_2 + clause_3
+        result = {employee_id: [] for employee_id in employees.ids}
+        for contract in self.env['hr.contract'].search(clause_final):
+            result[contract.employee_id.id].append(contract.id)
+        return result
 
     def is_not_six_months_passed(start_date_str):
         # Convert the start date string to a datetime object
@@ -165,17 +535,253 @@ class HrPayslip(models.Model):
         # Check if the current date is greater than or equal to 6 months after the start date
         return current_date <= six_months_after_start
 
-    def compute_sheet(self):
+    def _get_history(self):
+        """
+        @return: a PayslipHistory prefetching, for the employees of the payslips, the done payslips
+                 from the beginning of the year preceding the first period (year to date and
+                 rolling twelve months rules) up to today or the last period
+        """
+        if not self:
+            return None
+        date_from = min(self.mapped('date_from')) + relativedelta(years=-1, month=1, day=1)
+        date_to = max(self.mapped('date_to') + [fields.Date.today()])
+        return PayslipHistory(self.env, self.mapped('employee_id').ids, date_from, date_to)
+
+    def _get_attendance_days(self):
+        """
+        @return: a dict {payslip_id: (number of attendances, worked hours)} of the attendances of
+                 the employees checked in, in the ATTENDANCE_TZ timezone, within the payslip periods
+        """
+        if not self.ids:
+            return {}
+        self.flush(['employee_id', 'date_from', 'date_to'])
+        self.env['hr.attendance'].flush(['employee_id', 'check_in', 'worked_hours'])
+        self.env.cr.execute("""
+            SELECT hp.id, count(att.id), sum(att.worked_hours)
+            FROM hr_payslip as hp, hr_attendance as att
+            WHERE hp.id IN %(ids)s AND att.employee_id = hp.employee_id
+            AND att.check_in >= (hp.date_from::timestamp AT TIME ZONE %(tz)s) AT TIME ZONE 'UTC'
+            AND att.check_in < ((hp.date_to + 1)::timestamp AT TIME ZONE %(tz)s) AT TIME ZONE 'UTC'
+            GROUP BY hp.id""", {'ids': tuple(self.ids), 'tz': ATTENDANCE_TZ})
+        return {payslip_id: (count, hours or 0.0) for payslip_id, count, hours in self.env.cr.fetchall()}
+
+    def _write_computed_values(self, fname, values):
+        """ Set the values {payslip_id: value} of the char or text field ``fname`` of many payslips with a single query """
+        if not values:
+            return
+        self.flush([fname])
+        params = []
+        for payslip_id, value in values.items():
+            params += [payslip_id, value]
+        self.env.cr.execute("""
+            UPDATE hr_payslip AS hp
+            SET "%s" = v.value, write_uid = %%s, write_date = (now() at time zone 'UTC')
+            FROM (VALUES %s) AS v(id, value)
+            WHERE hp.id = v.id""" % (fname, ", ".join(["(%s, %s)"] * len(values))),
+            [self.env.uid] + params)
+        self.invalidate_cache([fname, 'write_uid', 'write_date'], list(values))
+
+    def _get_compute_fingerprints(self, payslip_contracts, attendances):
+        """
+        @param payslip_contracts: a dict {payslip_id: ids of the contracts the rules are applied to}
+        @param attendances: the attendance days of the payslips (see _get_attendance_days)
+        @return: a dict {payslip_id: digest of the data the computation of the payslip depends on}:
+                 employee, period, contracts, worked days, attendances, the structures, rules and
+                 categories of the plan, the tax brackets, and the done payslips of the employee.
+                 The inputs are compared apart, see ``_get_compute_replay``
+        """
+        history = {}
+        employee_ids = self.mapped('employee_id').ids
+        if employee_ids:
+            self.flush(['employee_id', 'state'])
+            # a done payslip leaving the done state does not change the last write date
+            self.env.cr.execute("""
+                SELECT employee_id, max(write_date), count(*), md5(string_agg(id::text, ',' ORDER BY id))
+                FROM hr_payslip
+                WHERE state = 'done' AND employee_id IN %s
+                GROUP BY employee_id""", [tuple(employee_ids)])
+            history = {
+                employee_id: (str(write_date), count, ids_digest)
+                for employee_id, write_date, count, ids_digest in self.env.cr.fetchall()
+            }
+        # tax brackets and PTKP given to the rules
+        self.env['hr.tax.bracket.table.line'].flush()
+        self.env['hr.ptkp'].flush()
+        self.env.cr.execute("""
+            SELECT max(write_date), count(*) FROM hr_tax_bracket_table_line
+            UNION ALL
+            SELECT max(write_date), count(*) FROM hr_ptkp""")
+        tax_tables = [(str(write_date), count) for write_date, count in self.env.cr.fetchall()]
+        fingerprints = {}
         for payslip in self:
-            number = payslip.number or self.env['ir.sequence'].next_by_code('salary.slip')
-            # delete old payslip lines
-            payslip.line_ids.unlink()
-            # set the list of contract for which the rules have to be applied
-            # if we don't give the contract, then the rules to apply should be for all current contracts of the employee
-            contract_ids = payslip.contract_id.ids or \
-                self.get_contract(payslip.employee_id, payslip.date_from, payslip.date_to)
-            lines = [(0, 0, line) for line in self._get_payslip_lines(contract_ids, payslip.id)]
-            payslip.write({'line_ids': lines, 'number': number})
+            contracts = self.env['hr.contract'].browse(payslip_contracts[payslip.id])
+            plan = self._get_rule_plan(contracts, payslip.struct_id)
+            rules = self.env['hr.salary.rule'].browse(plan['rule_ids'])
+            data = (
+                payslip.employee_id.id, str(payslip.employee_id.write_date),
+                str(payslip.date_from), str(payslip.date_to),
+                [(contract.id, str(contract.write_date), contract.wage) for contract in contracts],
+                sorted((line.code or '', line.contract_id.id, line.number_of_days, line.number_of_hours)
+                       for line in payslip.worked_days_line_ids),
+                attendances.get(payslip.id),
+                [(struct.id, str(struct.write_date))
+                 for struct in self.env['hr.payroll.structure'].browse(plan['structure_ids'])],
+                [(rule.id, str(rule.write_date)) for rule in rules],
+                [(category.id, str(category.write_date)) for category in rules.mapped('category_id')],
+                history.get(payslip.employee_id.id),
+                tax_tables,
+            )
+            fingerprints[payslip.id] = hashlib.sha1(repr(data).encode()).hexdigest()
+        return fingerprints
+
+    def _get_compute_inputs(self):
+        """ @return: a dict {payslip_id: {code: amount}} of the inputs as given to the rules """
+        return {payslip.id: {line.code: line.amount for line in payslip.input_line_ids} for payslip in self}
+
+    def _load_compute_state(self):
+        """ @return: the state saved by the last computation of the payslip, or None """
+        self.ensure_one()
+        try:
+            return json.loads(self.compute_state) if self.compute_state else None
+        except ValueError:
+            return None
+
+    def _get_compute_replay(self, previous, inputs, contract_ids):
+        """
+        Prepare the partial computation of the payslip whose only inputs changed since its last
+        computation: the rules not depending on the changed inputs take their previous results.
+
+        @param previous: the state of the last computation (see ``_load_compute_state``)
+        @param inputs: the current inputs {code: amount} of the payslip
+        @return: a dict with the previous results 'lines' {(rule id, contract id): (amount, qty, rate)}
+                 and the 'dirty' ids of the rules to evaluate again, or None when the payslip has
+                 to be computed entirely
+        """
+        self.ensure_one()
+        if not previous or 'lines' not in previous:
+            return None
+        plan = self._get_rule_plan(self.env['hr.contract'].browse(contract_ids), self.struct_id)
+        structures = self.env['hr.payroll.structure']
+        if not structures._get_rule_graph(plan['structure_ids'])['replayable']:
+            return None
+        previous_inputs = previous['inputs']
+        changed = frozenset(code for code in set(inputs) | set(previous_inputs)
+                            if inputs.get(code) != previous_inputs.get(code))
+        return {
+            'lines': {(rule_id, contract_id): (amount, qty, rate)
+                      for rule_id, contract_id, amount, qty, rate in previous['lines']},
+            'dirty': structures._get_dirty_rules(plan['structure_ids'], changed),
+        }
+
+    @api.model
+    def _dump_compute_state(self, inputs, lines):
+        """ @return: the state saved for the payslip computed from ``inputs`` into the line values ``lines`` """
+        try:
+            return json.dumps({'inputs': inputs, 'lines': [
+                [line['salary_rule_id'], line['contract_id'], line['amount'], line['quantity'], line['rate']]
+                for line in lines
+            ]})
+        except (TypeError, ValueError):
+            # results which are not plain numbers, the payslip will be computed entirely
+            return json.dumps({'inputs': inputs})
+
+    @api.model
+    def _invalidate_compute_fingerprints(self, rules):
+        """
+        Mark as stale the draft payslips whose plan contains the given rules, i.e. the payslips of
+        the structures holding the rules (or their parent rules) and of their children structures.
+        Payslips without structure nor contract are left to their fingerprint, which holds the
+        write date of the rules.
+        """
+        ancestors = rules
+        while ancestors.mapped('parent_rule_id') - ancestors:
+            ancestors |= ancestors.mapped('parent_rule_id')
+        structures = self.env['hr.payroll.structure'].sudo().search([('rule_ids', 'in', ancestors.ids)])
+        if not structures:
+            return
+        structures = structures.search([('id', 'child_of', structures.ids)])
+        payslips = self.sudo().search([
+            ('state', '=', 'draft'), ('compute_fingerprint', '!=', False),
+            '|', ('struct_id', 'in', structures.ids), ('contract_id.struct_id', 'in', structures.ids),
+        ])
+        payslips.write({'compute_fingerprint': False})
+
+    def compute_sheet(self):
+        # set the list of contract for which the rules have to be applied
+        # if we don't give the contract, then the rules to apply should be for all current contracts of the employee
+        payslip_contracts = {payslip.id: payslip.contract_id.ids for payslip in self}
+        periods = defaultdict(lambda: self.env['hr.payslip'])
+        for payslip in self.filtered(lambda payslip: not payslip.contract_id):
+            periods[(payslip.date_from, payslip.date_to)] |= payslip
+        for (date_from, date_to), period_payslips in periods.items():
+            employee_contracts = self.get_contracts(period_payslips.mapped('employee_id'), date_from, date_to)
+            for payslip in period_payslips:
+                payslip_contracts[payslip.id] = employee_contracts[payslip.employee_id.id]
+        attendances = self._get_attendance_days()
+        fingerprints = self._get_compute_fingerprints(payslip_contracts, attendances)
+        inputs = self._get_compute_inputs()
+        # only compute again the payslips whose data changed since their last computation, and
+        # only the rules depending on the inputs of the payslips whose only inputs changed
+        payslips = self
+        replays = {}
+        if not self.env.context.get('force_compute_sheet'):
+            payslips = self.browse()
+            for payslip in self:
+                if payslip.compute_fingerprint != fingerprints[payslip.id]:
+                    payslips |= payslip
+                    continue
+                previous = payslip._load_compute_state()
+                if previous is not None and previous['inputs'] == inputs[payslip.id]:
+                    continue
+                payslips |= payslip
+                replay = payslip._get_compute_replay(previous, inputs[payslip.id], payslip_contracts[payslip.id])
+                if replay is not None:
+                    replays[payslip.id] = replay
+            if len(payslips) < len(self):
+                _logger.debug("Skipped %s unchanged payslip(s)", len(self) - len(payslips))
+        history = payslips._get_history()
+        ytd = self.env['hr.payroll.ytd']._get_ledger(
+            payslips.mapped('employee_id').ids, {payslip.date_to.year for payslip in payslips})
+        numbers = {}
+        lines_vals = []
+        for payslip in self.filtered(lambda payslip: not payslip.number):
+            numbers[payslip.id] = self.env['ir.sequence'].next_by_code('salary.slip')
+        engine = self._get_rule_engine()
+        record_values = payslips._read_rule_record_values(payslip_contracts)
+        payslip_lines = {
+            payslip_id: self._get_payslip_lines(
+                payslip_contracts[payslip_id], payslip_id, history=history, attendances=attendances, ytd=ytd,
+                engine='python', record_values=record_values, replay=replay)
+            for payslip_id, replay in replays.items()
+        }
+        full_payslips = payslips.filtered(lambda payslip: payslip.id not in replays)
+        if engine == 'vectorized':
+            payslip_lines.update(full_payslips._get_payslip_lines_batch(
+                payslip_contracts, history=history, attendances=attendances, ytd=ytd, record_values=record_values))
+        else:
+            payslip_lines.update({
+                payslip.id: self._get_payslip_lines(
+                    payslip_contracts[payslip.id], payslip.id, history=history, attendances=attendances, ytd=ytd,
+                    engine=engine, record_values=record_values)
+                for payslip in full_payslips
+            })
+        if replays:
+            _logger.debug("Computed %s payslip(s) again on the rules depending on their changed inputs", len(replays))
+        compute_states = {
+            payslip.id: self._dump_compute_state(inputs[payslip.id], payslip_lines[payslip.id]) for payslip in payslips
+        }
+        for payslip in payslips:
+            for line in payslip_lines[payslip.id]:
+                line['slip_id'] = payslip.id
+                lines_vals.append(line)
+        # update the old payslip lines to the computed ones
+        updated, inserted, deleted = self.env['hr.payslip.line']._update_computed_lines(payslips.mapped('line_ids'), lines_vals)
+        if payslips:
+            _logger.info("Computed %s payslip(s): %s line(s) updated, %s inserted, %s deleted",
+                         len(payslips), updated, inserted, deleted)
+        self._write_computed_values('number', numbers)
+        self._write_computed_values('compute_fingerprint', {payslip.id: fingerprints[payslip.id] for payslip in payslips})
+        self._write_computed_values('compute_state', compute_states)
 
             # uang_sewa = 0
             # uang_makan = 0
@@ -201,30 +807,6 @@ class HrPayslip(models.Model):
 
 
 
-            hadir = 0
-            result=[]
-            local_timezone = pytz.timezone('Asia/Jakarta')
-            att = self.env['hr.attendance'].search([('employee_id', '=', payslip.employee_id.id)])
-            pid = self.env['hr.payslip'].search([('employee_id', '=', payslip.employee_id.id)])
-            nama = payslip.name
-            date_from = payslip.date_from.strftime('%d/%m/%Y')
-            date_to = payslip.date_to.strftime('%d/%m/%Y')
-            gaji = self.env['hr.contract'].search([('id', '=', payslip.contract_id.id)]).wage
-        
-
-            if att:
-                for line in att:
-                    # Assuming payslip.date_from and payslip.date_to are datetime.date objects
-                    check_in = line.check_in
-                    # Convert check_in to UTC and then to local timezone
-                    local_checkin = check_in.astimezone(local_timezone)
-                    # Use datetime.datetime directly for comparison
-                    if payslip.date_from <= local_checkin.date() <= payslip.date_to:
-                        result.append(line)
-            hadir = len(result)
-            pids = ', '.join(str(p.id) for p in pid)  # Mengambil ID dari setiap hr.payslip yang ditemukan
-
-            # raise UserError(f'ID : {pids}\nPayslip Name : {nama}\nDate Range : {date_from} - {date_to}\nGaji Bulanan : {gaji}\nJumlah Kehadiran: {hadir}')
             
 
 
@@ -404,225 +986,332 @@ class HrPayslip(models.Model):
             #         pph = self.env['hr.payslip.line'].search([('slip_id', '=', int(payslip.id)), ('code', 'in', ['PPH_21_BARU'])])
             #         pph.write({'amount': result})
 
+        if _logger.isEnabledFor(logging.DEBUG):
+            _logger.debug("Salary rule code cache after computing %s payslip(s): %s",
+                          len(self), self.env['hr.salary.rule']._get_code_cache_stats())
         return True
 
     @api.model
-    def get_worked_day_lines(self, contracts, date_from, date_to):
-        res = []
-        # fill only if the contract as a working schedule linked
-        for contract in contracts.filtered(lambda contract: contract.resource_calendar_id):
-            day_from = datetime.combine(fields.Date.from_string(date_from), time.min)
-            day_to = datetime.combine(fields.Date.from_string(date_to), time.max)
-
-            # compute leave days
-            leaves = {}
-            calendar = contract.resource_calendar_id
-            tz = timezone(calendar.tz)
-            day_leave_intervals = contract.employee_id.list_leaves(day_from, day_to, calendar=contract.resource_calendar_id)
-            for day, hours, leave in day_leave_intervals:
-                holiday = leave[:1].holiday_id
-                current_leave_struct = leaves.setdefault(holiday.holiday_status_id, {
-                    'name': holiday.holiday_status_id.name or _('Global Leaves'),
-                    'sequence': 5,
-                    'code': holiday.holiday_status_id.name or 'GLOBAL',
-                    'number_of_days': 0.0,
-                    'number_of_hours': 0.0,
-                    'contract_id': contract.id,
-                })
-                current_leave_struct['number_of_hours'] += hours
-                work_hours = calendar.get_work_hours_count(
-                    tz.localize(datetime.combine(day, time.min)),
-                    tz.localize(datetime.combine(day, time.max)),
-                    compute_leaves=False,
-                )
-                if work_hours:
-                    current_leave_struct['number_of_days'] += hours / work_hours
-
-            # compute worked days
-            work_data = contract.employee_id._get_work_days_data_batch(day_from, day_to, calendar=contract.resource_calendar_id)
-            attendances = {
-                'name': _("Normal Working Days paid at 100%"),
-                'sequence': 1,
-                'code': 'WORK100',
-                'number_of_days': work_data[contract.employee_id.id]['days'],
-                'number_of_hours': work_data[contract.employee_id.id]['hours'],
-                'contract_id': contract.id,
-            }
+    def _get_rule_plan(self, contracts, struct=None):
+        """
+        @return: the cached execution plan (see hr.payroll.structure._get_rule_plan) of the given
+                 structure, or of the structures of the given contracts
+        """
+        if len(contracts) == 1 and struct:
+            structure_ids = struct.ids
+        else:
+            structure_ids = contracts.mapped('struct_id').ids
+        return self.env['hr.payroll.structure']._get_rule_plan(tuple(sorted(structure_ids)))
 
-            res.append(attendances)
-            res.extend(leaves.values())
-        return res
+    @api.model
+    def get_worked_day_lines(self, contracts, date_from, date_to):
+        return WorkedDaysBatch(self.env, contracts, date_from, date_to).get_lines(contracts)
 
     @api.model
     def get_inputs(self, contracts, date_from, date_to):
         res = []
 
-        structure_ids = contracts.get_all_structures()
-        rule_ids = self.env['hr.payroll.structure'].browse(structure_ids).get_all_rules()
-        sorted_rule_ids = [id for id, sequence in sorted(rule_ids, key=lambda x:x[1])]
-        inputs = self.env['hr.salary.rule'].browse(sorted_rule_ids).mapped('input_ids')
+        structure_ids = tuple(sorted(set(contracts.mapped('struct_id').ids)))
+        templates = self.env['hr.payroll.structure']._get_input_templates(structure_ids)
 
         for contract in contracts:
-            for input in inputs:
+            for name, code in templates:
                 input_data = {
-                    'name': input.name,
-                    'code': input.code,
+                    'name': name,
+                    'code': code,
                     'contract_id': contract.id,
                 }
                 res += [input_data]
         return res
 
     @api.model
-    def _get_payslip_lines(self, contract_ids, payslip_id):
-        def _sum_salary_rule_category(localdict, category, amount):
-            if category.parent_id:
-                localdict = _sum_salary_rule_category(localdict, category.parent_id, amount)
-
-            if category.code in localdict['categories'].dict:
-                localdict['categories'].dict[category.code] += amount
-            else:
-                localdict['categories'].dict[category.code] = amount
-
-            return localdict
-
-        class BrowsableObject(object):
-            def __init__(self, employee_id, dict, env):
-                self.employee_id = employee_id
-                self.dict = dict
-                self.env = env
-
-            def __getattr__(self, attr):
-                return attr in self.dict and self.dict.__getitem__(attr) or 0.0
-
-        class InputLine(BrowsableObject):
-            """a class that will be used into the python code, mainly for usability purposes"""
-            def sum(self, code, from_date, to_date=None):
-                if to_date is None:
-                    to_date = fields.Date.today()
-                self.env.cr.execute("""
-                    SELECT sum(amount) as sum
-                    FROM hr_payslip as hp, hr_payslip_input as pi
-                    WHERE hp.employee_id = %s AND hp.state = 'done'
-                    AND hp.date_from >= %s AND hp.date_to <= %s AND hp.id = pi.payslip_id AND pi.code = %s""",
-                    (self.employee_id, from_date, to_date, code))
-                return self.env.cr.fetchone()[0] or 0.0
-
-        class WorkedDays(BrowsableObject):
-            """a class that will be used into the python code, mainly for usability purposes"""
-            def _sum(self, code, from_date, to_date=None):
-                if to_date is None:
-                    to_date = fields.Date.today()
-                self.env.cr.execute("""
-                    SELECT sum(number_of_days) as number_of_days, sum(number_of_hours) as number_of_hours
-                    FROM hr_payslip as hp, hr_payslip_worked_days as pi
-                    WHERE hp.employee_id = %s AND hp.state = 'done'
-                    AND hp.date_from >= %s AND hp.date_to <= %s AND hp.id = pi.payslip_id AND pi.code = %s""",
-                    (self.employee_id, from_date, to_date, code))
-                return self.env.cr.fetchone()
-
-            def sum(self, code, from_date, to_date=None):
-                res = self._sum(code, from_date, to_date)
-                return res and res[0] or 0.0
-
-            def sum_hours(self, code, from_date, to_date=None):
-                res = self._sum(code, from_date, to_date)
-                return res and res[1] or 0.0
-
-        class Payslips(BrowsableObject):
-            """a class that will be used into the python code, mainly for usability purposes"""
-
-            def sum(self, code, from_date, to_date=None):
-                if to_date is None:
-                    to_date = fields.Date.today()
-                self.env.cr.execute("""SELECT sum(case when hp.credit_note = False then (pl.total) else (-pl.total) end)
-                            FROM hr_payslip as hp, hr_payslip_line as pl
-                            WHERE hp.employee_id = %s AND hp.state = 'done'
-                            AND hp.date_from >= %s AND hp.date_to <= %s AND hp.id = pl.slip_id AND pl.code = %s""",
-                            (self.employee_id, from_date, to_date, code))
-                res = self.env.cr.fetchone()
-                return res and res[0] or 0.0
-
-        #we keep a dict with the result because a value can be overwritten by another rule with the same code
-        result_dict = {}
-        rules_dict = {}
+    def _prepare_rule_state(self, payslip_id, contract_ids, history=None, attendances=None, ytd=None, record_values=None):
+        """
+        @param record_values: the values of the contracts and employees read for the rules (see
+                              ``_read_rule_record_values``), the rules get the records if not given
+        @return: the state of the rules engine on a payslip: the payslip, its contracts, the
+                 execution plan and sorted rules, the local dict shared by its contracts, and the
+                 results, rules and blacklist filled while the rules are applied
+        """
         worked_days_dict = {}
         inputs_dict = {}
-        blacklist = []
+        rules_dict = {}
         payslip = self.env['hr.payslip'].browse(payslip_id)
         for worked_days_line in payslip.worked_days_line_ids:
             worked_days_dict[worked_days_line.code] = worked_days_line
         for input_line in payslip.input_line_ids:
             inputs_dict[input_line.code] = input_line
+        if attendances is None:
+            attendances = payslip._get_attendance_days()
+        if ATTENDANCE_CODE not in worked_days_dict:
+            number_of_days, number_of_hours = attendances.get(payslip.id, (0, 0.0))
+            worked_days_dict[ATTENDANCE_CODE] = WorkedDaysValue(
+                ATTENDANCE_CODE, _('Attendance Days'), number_of_days, number_of_hours)
 
         categories = BrowsableObject(payslip.employee_id.id, {}, self.env)
-        inputs = InputLine(payslip.employee_id.id, inputs_dict, self.env)
-        worked_days = WorkedDays(payslip.employee_id.id, worked_days_dict, self.env)
-        payslips = Payslips(payslip.employee_id.id, payslip, self.env)
+        inputs = InputLine(payslip.employee_id.id, inputs_dict, self.env, history)
+        worked_days = WorkedDays(payslip.employee_id.id, worked_days_dict, self.env, history)
+        payslips = Payslips(payslip.employee_id.id, payslip, self.env, history)
         rules = BrowsableObject(payslip.employee_id.id, rules_dict, self.env)
 
-        baselocaldict = {'categories': categories, 'rules': rules, 'payslip': payslips, 'worked_days': worked_days, 'inputs': inputs}
-        #get the ids of the structures on the contracts and their parent id as well
+        if ytd is None:
+            ytd = self.env['hr.payroll.ytd']._get_ledger(payslip.employee_id.ids, [payslip.date_to.year])
+        ytd = YearToDate(payslip.employee_id.id, ytd[(payslip.employee_id.id, payslip.date_to.year)], self.env)
+
+        baselocaldict = {'categories': categories, 'rules': rules, 'payslip': payslips, 'worked_days': worked_days, 'inputs': inputs, 'ytd': ytd,
+                         'brackets': TaxBrackets(self.env)}
         contracts = self.env['hr.contract'].browse(contract_ids)
-        if len(contracts) == 1 and payslip.struct_id:
-            structure_ids = list(set(payslip.struct_id._get_parent_structure().ids))
-        else:
-            structure_ids = contracts.get_all_structures()
-        #get the rules of the structure and thier children
-        rule_ids = self.env['hr.payroll.structure'].browse(structure_ids).get_all_rules()
-        #run the rules by sequence
-        sorted_rule_ids = [id for id, sequence in sorted(rule_ids, key=lambda x:x[1])]
-        sorted_rules = self.env['hr.salary.rule'].browse(sorted_rule_ids)
+        #get the execution plan of the structures on the contracts (and their parents)
+        plan = self._get_rule_plan(contracts, payslip.struct_id)
+        return {
+            'payslip': payslip,
+            'contracts': contracts,
+            'plan': plan,
+            #run the rules by sequence
+            'rules': self.env['hr.salary.rule'].browse(plan['rule_ids']),
+            'baselocaldict': baselocaldict,
+            'rules_dict': rules_dict,
+            #we keep a dict with the result because a value can be overwritten by another rule with the same code
+            'result_dict': {},
+            'blacklist': set(),
+            'record_values': record_values,
+        }
 
-        for contract in contracts:
-            employee = contract.employee_id
-            localdict = dict(baselocaldict, employee=employee, contract=contract)
-            for rule in sorted_rules:
-                key = rule.code + '-' + str(contract.id)
+    def _read_rule_record_values(self, payslip_contracts):
+        """
+        Read the fields of the contracts and employees used by the rules of the payslips of
+        ``self`` (as found in their code by the execution plans) for all of them at once.
+
+        @param payslip_contracts: a dict {payslip id: contract ids}
+        @return: a dict {'contract': {id: values}, 'employee': {id: values}} of the values of the
+                 non relational fields, the relational ones being only loaded in the cache
+        """
+        contracts = self.env['hr.contract'].browse({id for payslip in self for id in payslip_contracts[payslip.id]})
+        fnames = {'contract': set(), 'employee': set()}
+        for payslip in self:
+            plan = self._get_rule_plan(contracts.browse(payslip_contracts[payslip.id]), payslip.struct_id)
+            for name, plan_fnames in plan['record_fields'].items():
+                fnames[name].update(plan_fnames)
+        record_values = {}
+        for name, records in (('contract', contracts), ('employee', contracts.mapped('employee_id'))):
+            readable = set(records.check_field_access_rights('read', None))
+            read_fnames = [fname for fname in fnames[name] if fname in readable]
+            record_values[name] = values = {record.id: {} for record in records}
+            if not read_fnames or not records:
+                continue
+            plain_fnames = [fname for fname in read_fnames if records._fields[fname].type in RULE_VALUE_FIELD_TYPES]
+            for row in records.read(read_fnames):
+                values[row['id']] = {fname: row[fname] for fname in plain_fnames}
+        return record_values
+
+    def _get_rule_records(self, state, contract):
+        """ @return: the employee and the contract given to the rules on ``contract`` """
+        employee = contract.employee_id
+        record_values = state['record_values']
+        if record_values is None:
+            return employee, contract
+        return (RecordValues(employee, record_values['employee'].get(employee.id, {})),
+                RecordValues(contract, record_values['contract'].get(contract.id, {})))
+
+    def _apply_rule(self, state, localdict, contract, rule, amount, qty, rate, tot_rule=None):
+        """ Record the result of a rule applied on a contract of the payslip of ``state`` """
+        key = rule.code + '-' + str(contract.id)
+        #check if there is already a rule computed with that code
+        previous_amount = rule.code in localdict and localdict[rule.code] or 0.0
+        #set/overwrite the amount computed for this rule in the localdict
+        if tot_rule is None:
+            tot_rule = amount * qty * rate / 100.0
+        localdict[rule.code] = tot_rule
+        state['rules_dict'][rule.code] = rule
+        #sum the amount for its salary category
+        amount_delta = tot_rule - previous_amount
+        categories = localdict['categories'].dict
+        for code in state['plan']['category_codes'][rule.category_id.id]:
+            if code in categories:
+                categories[code] += amount_delta
+            else:
+                categories[code] = amount_delta
+        #create/overwrite the rule in the temporary results
+        state['result_dict'][key] = self._prepare_line_values(rule, contract, amount, qty, rate)
+
+    @api.model
+    def _prepare_line_values(self, rule, contract, amount, qty, rate):
+        return {
+            'salary_rule_id': rule.id,
+            'contract_id': contract.id,
+            'name': rule.name,
+            'code': rule.code,
+            'category_id': rule.category_id.id,
+            'sequence': rule.sequence,
+            'appears_on_payslip': rule.appears_on_payslip,
+            'condition_select': rule.condition_select,
+            'condition_python': rule.condition_python,
+            'condition_range': rule.condition_range,
+            'condition_range_min': rule.condition_range_min,
+            'condition_range_max': rule.condition_range_max,
+            'amount_select': rule.amount_select,
+            'amount_fix': rule.amount_fix,
+            'amount_python_compute': rule.amount_python_compute,
+            'amount_percentage': rule.amount_percentage,
+            'amount_percentage_base': rule.amount_percentage_base,
+            'register_id': rule.register_id.id,
+            'amount': amount,
+            'employee_id': contract.employee_id.id,
+            'quantity': qty,
+            'rate': rate,
+        }
+
+    def _run_rule_program(self, state, program):
+        """ Apply the rules of the payslip of ``state`` with the compiled program of its plan """
+        records = tuple(state['rules'])
+        for contract in state['contracts']:
+            results = []
+            localdict = make_rule_namespace(state['baselocaldict'], *self._get_rule_records(state, contract))
+            localdict.update(_ld=localdict, _cats=localdict['categories'].dict, _rules=state['rules_dict'],
+                             _records=records, _blacklist=state['blacklist'], _results=results, _step=None)
+            try:
+                _eval_compiled(program['code'], localdict, nocopy=True)
+            except:
+                if localdict['_step'] is None:
+                    raise
+                index, part = program['steps'][localdict['_step']]
+                raise UserError(records[index]._get_rule_error(part))
+            for index, amount, qty, rate in results:
+                rule = records[index]
+                state['result_dict'][rule.code + '-' + str(contract.id)] = \
+                    self._prepare_line_values(rule, contract, amount, qty, rate)
+
+    def _get_payslip_lines(self, contract_ids, payslip_id, history=None, attendances=None, ytd=None, engine=None,
+                           record_values=None, replay=None):
+        """
+        @param replay: the previous results of the rules and the rules to evaluate again (see
+                       ``_get_compute_replay``), the other rules taking their previous results;
+                       only used by the python engine
+        """
+        state = self._prepare_rule_state(payslip_id, contract_ids, history, attendances, ytd, record_values)
+        if (engine or self._get_rule_engine()) != 'python':
+            program = self.env['hr.payroll.structure']._get_rule_program(state['plan']['structure_ids'])
+            if program is not None:
+                self._run_rule_program(state, program)
+                return list(state['result_dict'].values())
+        for contract in state['contracts']:
+            localdict = make_rule_namespace(state['baselocaldict'], *self._get_rule_records(state, contract))
+            for rule in state['rules']:
+                if replay is not None and rule.id not in replay['dirty']:
+                    #the rule does not depend on the changed inputs, apply its previous result
+                    values = replay['lines'].get((rule.id, contract.id))
+                    if values is not None and rule.id not in state['blacklist']:
+                        self._apply_rule(state, localdict, contract, rule, *values)
+                    else:
+                        state['blacklist'].update(state['plan']['descendants'][rule.id])
+                    continue
                 localdict['result'] = None
                 localdict['result_qty'] = 1.0
                 localdict['result_rate'] = 100
                 #check if the rule can be applied
-                if rule._satisfy_condition(localdict) and rule.id not in blacklist:
+                if rule._satisfy_condition(localdict) and rule.id not in state['blacklist']:
                     #compute the amount of the rule
                     amount, qty, rate = rule._compute_rule(localdict)
-                    #check if there is already a rule computed with that code
-                    previous_amount = rule.code in localdict and localdict[rule.code] or 0.0
-                    #set/overwrite the amount computed for this rule in the localdict
-                    tot_rule = amount * qty * rate / 100.0
-                    localdict[rule.code] = tot_rule
-                    rules_dict[rule.code] = rule
-                    #sum the amount for its salary category
-                    localdict = _sum_salary_rule_category(localdict, rule.category_id, tot_rule - previous_amount)
-                    #create/overwrite the rule in the temporary results
-                    result_dict[key] = {
-                        'salary_rule_id': rule.id,
-                        'contract_id': contract.id,
-                        'name': rule.name,
-                        'code': rule.code,
-                        'category_id': rule.category_id.id,
-                        'sequence': rule.sequence,
-                        'appears_on_payslip': rule.appears_on_payslip,
-                        'condition_select': rule.condition_select,
-                        'condition_python': rule.condition_python,
-                        'condition_range': rule.condition_range,
-                        'condition_range_min': rule.condition_range_min,
-                        'condition_range_max': rule.condition_range_max,
-                        'amount_select': rule.amount_select,
-                        'amount_fix': rule.amount_fix,
-                        'amount_python_compute': rule.amount_python_compute,
-                        'amount_percentage': rule.amount_percentage,
-                        'amount_percentage_base': rule.amount_percentage_base,
-                        'register_id': rule.register_id.id,
-                        'amount': amount,
-                        'employee_id': contract.employee_id.id,
-                        'quantity': qty,
-                        'rate': rate,
-                    }
+                    self._apply_rule(state, localdict, contract, rule, amount, qty, rate)
                 else:
                     #blacklist this rule and its children
-                    blacklist += [id for id, seq in rule._recursive_search_of_rules()]
+                    state['blacklist'].update(state['plan']['descendants'][rule.id])
+
+        return list(state['result_dict'].values())
 
-        return list(result_dict.values())
+    @api.model
+    def _get_rule_engine(self):
+        """
+        @return: 'python' when the rules are interpreted one by one (for debugging), 'vectorized'
+                 when the simple rules are evaluated on arrays (requires numpy), else 'compiled'
+        """
+        params = self.env['ir.config_parameter'].sudo()
+        if params.get_param('bi_hr_payroll.rule_engine_interpreted'):
+            return 'python'
+        if numpy is not None and params.get_param('bi_hr_payroll.rule_engine_vectorized'):
+            return 'vectorized'
+        return 'compiled'
+
+    def _get_payslip_lines_batch(self, payslip_contracts, history=None, attendances=None, ytd=None, record_values=None):
+        """
+        Compute the lines of the payslips of ``self`` like ``_get_payslip_lines``, with the fixed
+        and percentage rules without python condition evaluated with numpy on all the payslips
+        sharing an execution plan at once. The payslips are run in waves of their i-th contract,
+        each wave running the rules by sequence on all its rows, so that every payslip sees the
+        rules, categories and blacklist in the same state as on the scalar engine.
+
+        @param payslip_contracts: a dict {payslip id: contract ids}
+        @return: a dict {payslip id: list of the line values}
+        """
+        contract_ids = {id for payslip in self for id in payslip_contracts[payslip.id]}
+        prefetch_ids = self.env['hr.contract'].browse(contract_ids)._prefetch_ids
+        groups = defaultdict(list)
+        states = []
+        for payslip in self:
+            state = self._prepare_rule_state(payslip.id, payslip_contracts[payslip.id], history, attendances, ytd, record_values)
+            state['contracts'] = state['contracts'].with_prefetch(prefetch_ids)
+            groups[state['plan']['rule_ids']].append(state)
+            states.append(state)
+        for group in groups.values():
+            for wave in range(max(len(state['contracts']) for state in group)):
+                rows = []
+                for state in group:
+                    if len(state['contracts']) > wave:
+                        contract = state['contracts'][wave]
+                        localdict = make_rule_namespace(state['baselocaldict'], *self._get_rule_records(state, contract))
+                        rows.append((state, contract, localdict))
+                for rule in group[0]['rules']:
+                    self._apply_rule_batch(rule, rows)
+        return {state['payslip'].id: list(state['result_dict'].values()) for state in states}
+
+    @api.model
+    def _apply_rule_batch(self, rule, rows):
+        """
+        Apply a rule on rows (state, contract, localdict) of distinct payslips, on arrays when the
+        rule allows it and on the scalar engine otherwise
+        """
+        localdicts = []
+        for state, contract, localdict in rows:
+            localdict['result'] = None
+            localdict['result_qty'] = 1.0
+            localdict['result_rate'] = 100
+            localdicts.append(localdict)
+        program = rule._get_vector_program()
+        if program is not None:
+            try:
+                quantities = eval_vector_expression(program['quantity'], localdicts)
+                if rule.condition_select == 'range':
+                    values = eval_vector_expression(program['condition_range'], localdicts)
+                    satisfied = (rule.condition_range_min <= values) & (values <= rule.condition_range_max)
+                else:
+                    satisfied = numpy.ones(len(rows), dtype=bool)
+                if rule.amount_select == 'fix':
+                    amounts = numpy.full(len(rows), rule.amount_fix)
+                    rate = 100.0
+                else:
+                    amounts = eval_vector_expression(program['amount_percentage_base'], localdicts)
+                    rate = rule.amount_percentage
+            except VectorFallback:
+                program = None
+        if program is None:
+            for state, contract, localdict in rows:
+                if rule._satisfy_condition(localdict) and rule.id not in state['blacklist']:
+                    amount, qty, rate = rule._compute_rule(localdict)
+                    self._apply_rule(state, localdict, contract, rule, amount, qty, rate)
+                else:
+                    state['blacklist'].update(state['plan']['descendants'][rule.id])
+            return
+        totals = amounts * quantities * rate / 100.0
+        if rule.amount_select == 'fix':
+            amounts = [rule.amount_fix] * len(rows)
+        else:
+            amounts = amounts.tolist()
+        for (state, contract, localdict), applies, amount, qty, tot_rule in zip(
+                rows, satisfied.tolist(), amounts, quantities.tolist(), totals.tolist()):
+            if applies and rule.id not in state['blacklist']:
+                self._apply_rule(state, localdict, contract, rule, amount, qty, rate, tot_rule)
+            else:
+                state['blacklist'].update(state['plan']['descendants'][rule.id])
 
     # YTI TODO To rename. This method is not really an onchange, as it is not in any view
     # employee_id and contract_id could be browse records
@@ -761,6 +1450,92 @@ class HrPayslipLine(models.Model):
         for line in self:  # Tambahkan titik dua (:) di akhir baris ini
             line.total = float(line.quantity) * line.amount * line.rate / 100
 
+    @api.model
+    def _get_computed_total(self, values):
+        """ @return: the total of the line values, rounded like the stored quantity, amount and rate """
+        quantity, amount, rate = (
+            self._fields[fname].convert_to_cache(values[fname], self)
+            for fname in ('quantity', 'amount', 'rate'))
+        return self._fields['total'].convert_to_cache(float(quantity) * amount * rate / 100, self)
+
+    @api.model
+    def _create_computed_lines(self, vals_list):
+        """
+        Create the lines computed by the payroll engine in one batch, with their total computed
+        from the given quantity, amount and rate instead of being recomputed line by line.
+        """
+        for values in vals_list:
+            values['total'] = self._get_computed_total(values)
+        lines = self.create(vals_list)
+        self.env.remove_to_compute(self._fields['total'], lines)
+        return lines
+
+    @api.model
+    def _update_computed_lines(self, lines, vals_list):
+        """
+        Update the existing ``lines`` to the lines computed by the payroll engine. Lines are
+        matched by payslip, rule and contract and only written when their values differ; the
+        lines which appeared are created and the lines which disappeared are deleted.
+        @return: the number of updated, inserted and deleted lines
+        """
+        lines = lines.with_context(compute_sheet=True)
+        existing = defaultdict(list)
+        for line in lines:
+            existing[(line.slip_id.id, line.salary_rule_id.id, line.contract_id.id)].append(line)
+        to_create = []
+        # most updates only change the figures of the lines, which are written with a single query
+        figures = []
+        updates = []
+        for values in vals_list:
+            matches = existing.get((values['slip_id'], values['salary_rule_id'], values['contract_id']))
+            if not matches:
+                to_create.append(values)
+                continue
+            line = matches.pop(0)
+            changes = {}
+            for fname, value in values.items():
+                field = self._fields[fname]
+                if field.convert_to_record(field.convert_to_cache(value, line), line) != line[fname]:
+                    changes[fname] = value
+            if not changes:
+                continue
+            if set(changes) <= {'amount', 'quantity', 'rate'}:
+                figures.append((line.id,) + tuple(
+                    self._fields[fname].convert_to_cache(values[fname], line)
+                    for fname in ('amount', 'quantity', 'rate')) + (self._get_computed_total(values),))
+            else:
+                updates.append((line, changes))
+        if figures:
+            lines.flush(['amount', 'quantity', 'rate', 'total'])
+            self.env.cr.execute("""
+                UPDATE hr_payslip_line AS l
+                SET amount = v.amount, quantity = v.quantity, rate = v.rate, total = v.total,
+                    write_uid = %%s, write_date = (now() at time zone 'UTC')
+                FROM (VALUES %s) AS v(id, amount, quantity, rate, total)
+                WHERE l.id = v.id""" % ", ".join(["(%s, %s, %s, %s, %s)"] * len(figures)),
+                [self.env.uid] + [value for row in figures for value in row])
+            lines.invalidate_cache(['amount', 'quantity', 'rate', 'total', 'write_uid', 'write_date'],
+                                   [row[0] for row in figures])
+        for line, changes in updates:
+            line.write(changes)
+        to_delete = self.browse([line.id for matches in existing.values() for line in matches])
+        to_delete.with_context(compute_sheet=True).unlink()
+        self.with_context(compute_sheet=True)._create_computed_lines(to_create)
+        return len(figures) + len(updates), len(to_create), len(to_delete)
+
+    def _reset_compute_fingerprint(self):
+        """ Lines edited by hand: the payslips have to be computed again """
+        if not self.env.context.get('compute_sheet'):
+            self.mapped('slip_id').filtered('compute_fingerprint').write({'compute_fingerprint': False})
+
+    def write(self, vals):
+        self._reset_compute_fingerprint()
+        return super(HrPayslipLine, self).write(vals)
+
+    def unlink(self):
+        self._reset_compute_fingerprint()
+        return super(HrPayslipLine, self).unlink()
+
     @api.model_create_multi
     def create(self, vals_list):
         for values in vals_list:
@@ -770,7 +1545,9 @@ class HrPayslipLine(models.Model):
                 values['contract_id'] = values.get('contract_id') or payslip.contract_id and payslip.contract_id.id
                 if not values['contract_id']:
                     raise UserError(_('You must set a contract to create a payslip line.'))
-        return super(HrPayslipLine, self).create(vals_list)
+        lines = super(HrPayslipLine, self).create(vals_list)
+        lines._reset_compute_fingerprint()
+        return lines
 
 
 class HrPayslipWorkedDays(models.Model):
@@ -823,9 +1600,312 @@ class HrPayslipRun(models.Model):
     credit_note = fields.Boolean(string='Credit Note', readonly=True,
         states={'draft': [('readonly', False)]},
         help="If its checked, indicates that all payslips generated from here are refund payslips.")
+    chunk_ids = fields.One2many('hr.payslip.run.chunk', 'run_id', string='Chunks', readonly=True)
+    chunk_pending_count = fields.Integer(compute='_compute_chunk_progress', string='Pending Chunks')
+    chunk_done_count = fields.Integer(compute='_compute_chunk_progress', string='Done Chunks')
+    chunk_failed_count = fields.Integer(compute='_compute_chunk_progress', string='Failed Chunks')
+    chunk_progress = fields.Float(compute='_compute_chunk_progress', string='Progress')
+    chunk_date_eta = fields.Datetime(compute='_compute_chunk_progress', string='Estimated End')
+    chunk_notify_user_id = fields.Many2one('res.users', string='Notified User', readonly=True, copy=False,
+        help="User notified once all the chunks of the batch are computed")
+
+    def _compute_chunk_progress(self):
+        now = fields.Datetime.now()
+        for run in self:
+            chunks = run.chunk_ids
+            done = chunks.filtered(lambda chunk: chunk.state == 'done')
+            failed = chunks.filtered(lambda chunk: chunk.state == 'failed')
+            remaining = len(chunks) - len(done) - len(failed)
+            durations = [(chunk.date_end - chunk.date_start).total_seconds()
+                         for chunk in done if chunk.date_start and chunk.date_end]
+            run.chunk_pending_count = remaining
+            run.chunk_done_count = len(done)
+            run.chunk_failed_count = len(failed)
+            run.chunk_progress = chunks and 100.0 * (len(done) + len(failed)) / len(chunks) or 0.0
+            run.chunk_date_eta = remaining and durations and \
+                now + timedelta(seconds=remaining * sum(durations) / len(durations)) or False
 
     def draft_payslip_run(self):
         return self.write({'state': 'draft'})
 
     def close_payslip_run(self):
-        return self.write({'state': 'close'})
\ No newline at end of file
+        return self.write({'state': 'close'})
+
+    def _generate_payslips_chunk(self, employees):
+        """
+        Create and compute the payslips of the given employees for the batch, as
+        onchange_employee_id would fill them, with the data of all employees prefetched and
+        the payslips, worked days and inputs created in one call each
+        @return: the created payslips
+        """
+        self.ensure_one()
+        Payslip = self.env['hr.payslip']
+        employees = employees.with_prefetch(employees.ids)
+        employee_contracts = Payslip.get_contracts(employees, self.date_start, self.date_end)
+        contracts = self.env['hr.contract'].browse([id for ids in employee_contracts.values() for id in ids])
+        worked_days_batch = WorkedDaysBatch(self.env, contracts, self.date_start, self.date_end)
+        ttyme = datetime.combine(fields.Date.from_string(self.date_start), time.min)
+        locale = self.env.context.get('lang') or 'en_US'
+        period_name = tools.ustr(babel.dates.format_date(date=ttyme, format='MMMM-y', locale=locale))
+
+        vals_list = []
+        lines = []
+        for employee in employees:
+            res = {
+                'employee_id': employee.id,
+                'name': _('Salary Slip of %s for %s') % (employee.name, period_name),
+                'struct_id': False,
+                'contract_id': False,
+                'payslip_run_id': self.id,
+                'date_from': self.date_start,
+                'date_to': self.date_end,
+                'credit_note': self.credit_note,
+                'company_id': employee.company_id.id,
+            }
+            worked_days_line_ids = input_line_ids = []
+            contract_ids = employee_contracts[employee.id]
+            if contract_ids:
+                slip_contracts = contracts.browse(contract_ids)
+                contract = slip_contracts[0]
+                res['contract_id'] = contract.id
+                if contract.struct_id:
+                    res['struct_id'] = contract.struct_id.id
+                    worked_days_line_ids = worked_days_batch.get_lines(slip_contracts)
+                    input_line_ids = Payslip.get_inputs(slip_contracts, self.date_start, self.date_end)
+            vals_list.append(res)
+            lines.append((worked_days_line_ids, input_line_ids))
+
+        payslips = Payslip.create(vals_list)
+        worked_days_vals = []
+        inputs_vals = []
+        for payslip, (worked_days_line_ids, input_line_ids) in zip(payslips, lines):
+            worked_days_vals += [dict(values, payslip_id=payslip.id) for values in worked_days_line_ids]
+            inputs_vals += [dict(values, payslip_id=payslip.id) for values in input_line_ids]
+        self.env['hr.payslip.worked_days'].create(worked_days_vals)
+        self.env['hr.payslip.input'].create(inputs_vals)
+        payslips.with_context(value=True).compute_sheet()
+        return payslips
+
+    def _get_chunk_size(self):
+        return max(int(self.env['ir.config_parameter'].sudo().get_param('bi_hr_payroll.payslip_run_chunk_size', 200)), 1)
+
+    def _split_employees(self, employees):
+        """ @return: an iterator over the employees, by recordsets of the configured chunk size """
+        chunk_size = self._get_chunk_size()
+        for start in range(0, len(employees), chunk_size):
+            yield employees[start:start + chunk_size]
+
+    def _create_chunks(self, employee_chunks, domain=None):
+        """
+        Create the chunks of the batch
+        @param employee_chunks: an iterable of the employees of each chunk, consumed lazily
+        @param domain: the domain the employees were searched with, by increasing id; the chunks
+                       keep it with the bounds of their ids instead of their employees
+        """
+        self.ensure_one()
+        chunks = self.env['hr.payslip.run.chunk']
+        for index, employees in enumerate(employee_chunks):
+            values = {
+                'run_id': self.id,
+                'sequence': index,
+            }
+            if domain is None:
+                values['employee_ids'] = [(6, 0, employees.ids)]
+            else:
+                values.update({
+                    'employee_domain': repr(domain),
+                    'employee_id_from': employees[0].id,
+                    'employee_id_to': employees[-1].id,
+                })
+            chunks |= chunks.create(values)
+        return chunks
+
+    def _enqueue_chunks(self, employee_chunks, domain=None):
+        """ Queue the payslips of the employees, computed chunk by chunk by the scheduled action """
+        chunks = self._create_chunks(employee_chunks, domain=domain)
+        self.chunk_notify_user_id = self.env.user
+        self.env.ref('bi_hr_payroll.ir_cron_payslip_run_chunks')._trigger()
+        return chunks
+
+    @api.model
+    def _notify_chunks_done(self):
+        """
+        Tell the users who queued the batches that all their chunks were computed. The batches are
+        picked and their user reset by a single locking update, so that each batch is notified once
+        whatever the scheduled actions and processes computing its chunks.
+        """
+        self.flush(['chunk_notify_user_id'])
+        self.env['hr.payslip.run.chunk'].flush(['run_id', 'state'])
+        self.env.cr.execute("""
+            WITH done AS (
+                SELECT r.id, r.chunk_notify_user_id FROM hr_payslip_run AS r
+                WHERE r.chunk_notify_user_id IS NOT NULL AND NOT EXISTS (
+                    SELECT 1 FROM hr_payslip_run_chunk AS c
+                    WHERE c.run_id = r.id AND c.state IN ('pending', 'running'))
+                FOR UPDATE OF r SKIP LOCKED
+            )
+            UPDATE hr_payslip_run AS r SET chunk_notify_user_id = NULL
+            FROM done WHERE r.id = done.id
+            RETURNING r.id, done.chunk_notify_user_id""")
+        rows = self.env.cr.fetchall()
+        self.invalidate_cache(['chunk_notify_user_id'], [run_id for run_id, user_id in rows])
+        for run_id, user_id in rows:
+            run = self.browse(run_id)
+            partner = self.env['res.users'].browse(user_id).partner_id
+            message = _("%s payslip(s) generated in %s chunk(s).") % (
+                sum(run.chunk_ids.mapped('payslip_count')), run.chunk_done_count)
+            if run.chunk_failed_count:
+                message += " " + _("%s chunk(s) failed and can be retried from the batch.") % run.chunk_failed_count
+            self.env['bus.bus']._sendone(partner, 'simple_notification', {
+                'title': _("Payslip Batch %s") % run.name,
+                'message': message,
+                'warning': bool(run.chunk_failed_count),
+                'sticky': bool(run.chunk_failed_count),
+            })
+
+
+class HrPayslipRunChunk(models.Model):
+    _name = 'hr.payslip.run.chunk'
+    _description = 'Payslip Batch Chunk'
+    _order = 'run_id, sequence, id'
+
+    run_id = fields.Many2one('hr.payslip.run', string='Payslip Batch', required=True, ondelete='cascade', index=True)
+    sequence = fields.Integer(default=10)
+    employee_ids = fields.Many2many('hr.employee', 'hr_payslip_run_chunk_employee_rel', 'chunk_id', 'employee_id',
+        string='Employees', readonly=True)
+    employee_domain = fields.Char(readonly=True,
+        help="Domain of the employees of the chunk, within its bounds, when they are not given one by one")
+    employee_id_from = fields.Integer(readonly=True)
+    employee_id_to = fields.Integer(readonly=True)
+    employee_count = fields.Integer(compute='_compute_employee_count', string='Employee Count')
+    state = fields.Selection([
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ], string='Status', index=True, readonly=True, copy=False, default='pending', required=True)
+    payslip_count = fields.Integer(string='Payslips', readonly=True)
+    error = fields.Text(readonly=True)
+    date_start = fields.Datetime(string='Started on', readonly=True, copy=False)
+    date_end = fields.Datetime(string='Ended on', readonly=True, copy=False)
+
+    def _compute_employee_count(self):
+        for chunk in self:
+            if chunk.employee_domain:
+                chunk.employee_count = self.env['hr.employee'].search_count(chunk._get_employee_domain())
+            else:
+                chunk.employee_count = len(chunk.employee_ids)
+
+    def _get_employee_domain(self):
+        self.ensure_one()
+        return safe_eval(self.employee_domain) + [
+            ('id', '>=', self.employee_id_from),
+            ('id', '<=', self.employee_id_to),
+        ]
+
+    def _get_employees(self):
+        """ @return: the employees of the chunk """
+        self.ensure_one()
+        if not self.employee_domain:
+            return self.employee_ids
+        return self.env['hr.employee'].search(self._get_employee_domain(), order='id')
+
+    def _run(self):
+        """
+        Generate the payslips of each chunk; a failing chunk is rolled back and flagged without
+        affecting the others, and every chunk is committed unless running the tests. Each chunk
+        is locked until it is committed, the chunks locked or computed by another transaction
+        (another run of the scheduled action or a worker process) are skipped.
+        """
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        self.flush(['state'])
+        for chunk in self:
+            self.env.cr.execute("""
+                SELECT state FROM hr_payslip_run_chunk WHERE id = %s
+                FOR UPDATE SKIP LOCKED""", [chunk.id])
+            row = self.env.cr.fetchone()
+            if not row or row[0] not in ('pending', 'failed'):
+                _logger.info("Skipped chunk %s of payslip batch %s, computed by another transaction",
+                             chunk.sequence, chunk.run_id.name)
+                continue
+            chunk.invalidate_cache()
+            chunk.write({'state': 'running', 'error': False, 'date_start': fields.Datetime.now(), 'date_end': False})
+            try:
+                with self.env.cr.savepoint():
+                    payslips = chunk.run_id._generate_payslips_chunk(chunk._get_employees())
+                    chunk.write({'state': 'done', 'payslip_count': len(payslips), 'date_end': fields.Datetime.now()})
+            except Exception as e:
+                _logger.exception("Failed to compute chunk %s of payslip batch %s", chunk.sequence, chunk.run_id.name)
+                chunk.write({'state': 'failed', 'error': tools.ustr(e), 'date_end': fields.Datetime.now()})
+            if auto_commit:
+                self.env.cr.commit()
+        return True
+
+    def _run_in_processes(self, workers):
+        """
+        Compute the chunks in a pool of processes forked from the current one, each chunk in its
+        own cursor; the chunks of a failing pool are flagged to be retried.
+        """
+        try:
+            with ProcessPoolExecutor(max_workers=min(workers, len(self)),
+                                     mp_context=multiprocessing.get_context('fork'),
+                                     initializer=_init_payslip_run_process) as executor:
+                list(executor.map(_run_payslip_run_chunk, [self.env.cr.dbname] * len(self),
+                                  [self.env.uid] * len(self), [dict(self.env.context)] * len(self), self.ids))
+        except Exception as e:
+            _logger.exception("Payslip batch chunks computation interrupted")
+            self.invalidate_cache()
+            self.filtered(lambda chunk: chunk.state in ('pending', 'running')).write({
+                'state': 'failed',
+                'error': tools.ustr(e),
+            })
+        # end the transaction started before the processes, to see the chunks they computed
+        self.env.cr.commit()
+        self.invalidate_cache()
+        return True
+
+    @api.model
+    def _cron_run_pending(self, time_budget=300):
+        """
+        Scheduled action computing the queued chunks. Chunks are locked while they are computed,
+        so that several workers may consume the queue. With several workers configured, the chunks
+        are computed by a pool of processes. The action triggers itself again when chunks remain
+        after the time budget (in seconds).
+        """
+        workers = int(self.env['ir.config_parameter'].sudo().get_param('bi_hr_payroll.payslip_run_workers', 0))
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        processes = workers > 1 and auto_commit
+        start = time_module.time()
+        while time_module.time() - start < time_budget:
+            self.env['hr.payslip.run']._notify_chunks_done()
+            if auto_commit:
+                self.env.cr.commit()
+            if processes:
+                # not locked here: each process locks the chunk it computes
+                self.env.cr.execute("""
+                    SELECT id FROM hr_payslip_run_chunk WHERE state = 'pending'
+                    ORDER BY run_id, sequence, id
+                    LIMIT %s""", [workers])
+            else:
+                self.env.cr.execute("""
+                    SELECT id FROM hr_payslip_run_chunk WHERE state = 'pending'
+                    ORDER BY run_id, sequence, id
+                    LIMIT 1 FOR UPDATE SKIP LOCKED""")
+            chunks = self.browse([row[0] for row in self.env.cr.fetchall()])
+            if not chunks:
+                return True
+            if processes:
+                chunks._run_in_processes(workers)
+            else:
+                chunks._run()
+        self.env.ref('bi_hr_payroll.ir_cron_payslip_run_chunks')._trigger()
+        return True
+
+    def action_retry(self):
+        """ Queue the failed chunks again, computed by the scheduled action """
+        chunks = self.filtered(lambda chunk: chunk.state == 'failed')
+        chunks.write({'state': 'pending', 'error': False})
+        if chunks:
+            chunks.mapped('run_id').write({'chunk_notify_user_id': self.env.uid})
+            self.env.ref('bi_hr_payroll.ir_cron_payslip_run_chunks')._trigger()
+        return True
\ No newline at end of file
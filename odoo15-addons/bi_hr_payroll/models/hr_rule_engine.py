@@ -0,0 +1,373 @@
+# -*- coding: utf-8 -*-
+# Part of BrowseInfo. See LICENSE file for full copyright and licensing details.
+
+import ast
+from numbers import Real
+
+from odoo.tools.safe_eval import _BUILTINS, _SAFE_OPCODES, assert_valid_codeobj, check_values, test_expr
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# names of the rules local dict which are not rule codes
+RESERVED_NAMES = frozenset([
+    'categories', 'rules', 'payslip', 'worked_days', 'inputs', 'ytd', 'brackets',
+    'employee', 'contract', 'result', 'result_qty', 'result_rate',
+])
+
+# syntax allowed in the code of the salary rules, names and attributes starting with an
+# underscore being reserved to the engine
+_ALLOWED_NODES = tuple(getattr(ast, name) for name in [
+    'Module', 'Expression', 'Expr', 'Assign', 'AugAssign', 'Delete', 'Pass', 'Break', 'Continue',
+    'If', 'For', 'While', 'Try', 'ExceptHandler', 'Raise', 'Assert',
+    'BoolOp', 'BinOp', 'UnaryOp', 'Compare', 'IfExp', 'Call', 'keyword', 'Lambda', 'arguments', 'arg',
+    'Name', 'Attribute', 'Subscript', 'Index', 'Slice', 'ExtSlice', 'Starred',
+    'Constant', 'Num', 'Str', 'Bytes', 'NameConstant', 'JoinedStr', 'FormattedValue',
+    'List', 'Tuple', 'Dict', 'Set', 'ListComp', 'SetComp', 'DictComp', 'GeneratorExp', 'comprehension',
+    'operator', 'boolop', 'cmpop', 'unaryop', 'expr_context',
+] if hasattr(ast, name))
+
+_BINARY_OPERATORS = {ast.Add: 'add', ast.Sub: 'sub', ast.Mult: 'mul', ast.Div: 'div'}
+
+
+def check_rule_ast(tree):
+    """ @raise ValueError: when the AST of a rule source holds syntax or names not allowed in the salary rules """
+    for node in ast.walk(tree):
+        if not isinstance(node, _ALLOWED_NODES):
+            raise ValueError("%s is not allowed in the salary rules" % type(node).__name__)
+        name = isinstance(node, ast.Name) and node.id or isinstance(node, ast.Attribute) and node.attr \
+            or isinstance(node, ast.arg) and node.arg or isinstance(node, ast.keyword) and node.arg
+        if name and name.startswith('_'):
+            raise ValueError("The name %r is not allowed in the salary rules" % name)
+
+
+def compile_rule_code(expr, mode):
+    """
+    Validate the source of a rule against the syntax whitelist and the safe_eval opcodes, once
+    per version of the rule.
+
+    @return: the code object of the source
+    @raise ValueError, SyntaxError: when the source is not allowed or not valid
+    """
+    # like test_expr, strip the expressions only
+    check_rule_ast(ast.parse(expr.strip() if mode == 'eval' else expr, mode=mode))
+    return test_expr(expr, _SAFE_OPCODES, mode=mode)
+
+
+def collect_record_fields(sources, names=('contract', 'employee')):
+    """
+    @param sources: a list of tuples (python source, eval mode) of rules
+    @return: a dict {name: set of attributes} of the attributes the sources read directly on the
+             given names of the local dict, like ``contract.wage``
+    """
+    attributes = {name: set() for name in names}
+    for expr, mode in sources:
+        try:
+            tree = ast.parse((expr or '').strip() if mode == 'eval' else (expr or ''), mode=mode)
+        except SyntaxError:
+            continue
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name) and node.value.id in attributes:
+                attributes[node.value.id].add(node.attr)
+    return attributes
+
+
+# objects of the local dict giving the values computed for the payslip, by kind of reference
+_REFERENCE_OBJECTS = {'rules': 'codes', 'categories': 'categories', 'inputs': 'inputs', 'worked_days': 'worked_days'}
+
+
+def analyse_rule_references(sources):
+    """
+    Find the values of the payslip read by rule sources: the codes of the rules (bare names and
+    ``rules.X``), ``categories.X``, ``inputs.X`` and ``worked_days.X``. The ``sum`` helpers read
+    the done payslips and are not references.
+
+    @param sources: a list of tuples (python source, eval mode) of a rule
+    @return: a dict of frozensets 'codes', 'categories', 'inputs', 'worked_days', 'names' (the
+             other names read, which are references when they are rule codes or set by other
+             rules) and 'stores' (the names set, which stay in the local dict of the contract),
+             and 'opaque', true when the sources use these objects in a way that can not be
+             followed, like ``categories.dict`` or passing ``inputs`` to a function
+    """
+    references = {kind: set() for kind in ('codes', 'categories', 'inputs', 'worked_days', 'names', 'stores')}
+    opaque = False
+    for expr, mode in sources:
+        try:
+            tree = ast.parse((expr or '').strip() if mode == 'eval' else (expr or ''), mode=mode)
+        except SyntaxError:
+            opaque = True
+            continue
+        parents = {}
+        for node in ast.walk(tree):
+            for child in ast.iter_child_nodes(node):
+                parents[child] = node
+        for node in ast.walk(tree):
+            if not isinstance(node, ast.Name):
+                continue
+            if not isinstance(node.ctx, ast.Load):
+                if node.id not in RESERVED_NAMES:
+                    references['stores'].add(node.id)
+                continue
+            parent = parents.get(node)
+            attr = isinstance(parent, ast.Attribute) and parent.value is node and parent.attr
+            if node.id in _REFERENCE_OBJECTS:
+                if not attr or attr == 'dict':
+                    opaque = True
+                elif attr not in ('sum', 'sum_hours'):
+                    references[_REFERENCE_OBJECTS[node.id]].add(attr)
+            elif node.id == 'payslip':
+                # the payslip record gives its lines, inputs and worked days
+                opaque = opaque or attr in ('dict', 'input_line_ids', 'worked_days_line_ids')
+            elif node.id not in RESERVED_NAMES:
+                references['names'].add(node.id)
+    result = {kind: frozenset(values) for kind, values in references.items()}
+    result['opaque'] = opaque
+    return result
+
+
+def make_rule_namespace(baselocaldict, employee, contract):
+    """
+    @return: the namespace the rules of a contract run in: the fixed slots of the local dict,
+             checked and given the safe builtins once, to which the rules add their codes.
+             Rule sources checked by ``compile_rule_code`` can not reach the engine names nor
+             rebind anything in eval mode, so the namespace is shared by all the rules without
+             being copied nor checked again.
+    """
+    namespace = dict(baselocaldict, employee=employee, contract=contract,
+                     result=None, result_qty=1.0, result_rate=100)
+    check_values(namespace)
+    namespace['__builtins__'] = _BUILTINS
+    return namespace
+
+
+class VectorFallback(Exception):
+    """ Raised when an expression can not be evaluated on arrays for the given rows """
+
+
+def parse_vector_expression(expr, numeric_fields):
+    """
+    Translate a rule expression into a tree of tuples that ``eval_vector_expression`` evaluates
+    on many rows at once. Only the expressions whose value does not depend on python semantics
+    beyond float arithmetic are translated:
+    - numeric literals, ``contract.<float field>``, codes of the previous rules
+    - ``categories.CODE``, ``worked_days.CODE.number_of_days``, ``inputs.CODE.amount``
+    - ``+``, ``-``, ``*``, ``/`` and unary ``-`` of the above
+
+    @param numeric_fields: the names of the float fields of hr.contract
+    @return: the expression tree, or None when the expression has to run on the scalar engine
+    """
+    try:
+        node = ast.parse((expr or '').strip(), mode='eval').body
+    except SyntaxError:
+        return None
+    return _translate(node, numeric_fields)
+
+
+def _translate(node, numeric_fields):
+    if isinstance(node, ast.Constant):
+        if isinstance(node.value, Real) and not isinstance(node.value, bool):
+            return ('const', float(node.value))
+        return None
+    if isinstance(node, ast.Name):
+        if node.id in RESERVED_NAMES:
+            return None
+        return ('code', node.id)
+    if isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name):
+        if node.value.id == 'contract' and node.attr in numeric_fields:
+            return ('contract', node.attr)
+        if node.value.id == 'categories':
+            return ('category', node.attr)
+        return None
+    if isinstance(node, ast.Attribute) and isinstance(node.value, ast.Attribute) \
+            and isinstance(node.value.value, ast.Name):
+        line = (node.value.value.id, node.attr)
+        if line in (('worked_days', 'number_of_days'), ('worked_days', 'number_of_hours'), ('inputs', 'amount')):
+            return ('line', node.value.value.id, node.value.attr, node.attr)
+        return None
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+        operand = _translate(node.operand, numeric_fields)
+        return operand and ('neg', operand)
+    if isinstance(node, ast.BinOp) and type(node.op) in _BINARY_OPERATORS:
+        left = _translate(node.left, numeric_fields)
+        right = _translate(node.right, numeric_fields)
+        return left and right and (_BINARY_OPERATORS[type(node.op)], left, right)
+    return None
+
+
+def _row_value(value):
+    if not isinstance(value, Real) or isinstance(value, bool):
+        raise VectorFallback()
+    return value
+
+
+def eval_vector_expression(tree, localdicts):
+    """
+    @param tree: an expression tree of ``parse_vector_expression``
+    @param localdicts: the local dicts of the rules of the rows
+    @return: a numpy array of the values of the expression on the rows
+    @raise VectorFallback: when the expression would not evaluate to a number (or would raise)
+                           on one of the rows, to evaluate it on the scalar engine instead
+    """
+    kind = tree[0]
+    if kind == 'const':
+        return numpy.full(len(localdicts), tree[1])
+    if kind == 'contract':
+        return numpy.array([_row_value(localdict['contract'][tree[1]]) for localdict in localdicts], dtype=float)
+    if kind == 'code':
+        if any(tree[1] not in localdict for localdict in localdicts):
+            raise VectorFallback()
+        return numpy.array([_row_value(localdict[tree[1]]) for localdict in localdicts], dtype=float)
+    if kind == 'category':
+        # same as BrowsableObject.__getattr__
+        return numpy.array([
+            _row_value(tree[1] in localdict['categories'].dict and localdict['categories'].dict[tree[1]] or 0.0)
+            for localdict in localdicts
+        ], dtype=float)
+    if kind == 'line':
+        values = []
+        for localdict in localdicts:
+            line = localdict[tree[1]].dict.get(tree[2])
+            if not line:
+                # the scalar engine would fail on an attribute of 0.0
+                raise VectorFallback()
+            values.append(_row_value(getattr(line, tree[3])))
+        return numpy.array(values, dtype=float)
+    if kind == 'neg':
+        return -eval_vector_expression(tree[1], localdicts)
+    left = eval_vector_expression(tree[1], localdicts)
+    right = eval_vector_expression(tree[2], localdicts)
+    if kind == 'add':
+        return left + right
+    if kind == 'sub':
+        return left - right
+    if kind == 'mul':
+        return left * right
+    if not right.all():
+        # python raises on a division by zero
+        raise VectorFallback()
+    return left / right
+
+
+class _RuleSourceInliner(ast.NodeTransformer):
+    """ Replace the ``_expr(index, fname)`` and ``_code(index, fname)`` markers of a generated program by the rule sources """
+
+    def __init__(self, sources):
+        self.sources = sources
+
+    def visit_Call(self, node):
+        if isinstance(node.func, ast.Name) and node.func.id == '_expr':
+            return self.sources[(node.args[0].value, node.args[1].value)]
+        return self.generic_visit(node)
+
+    def visit_Expr(self, node):
+        if isinstance(node.value, ast.Call) and isinstance(node.value.func, ast.Name) and node.value.func.id == '_code':
+            return self.sources[(node.value.args[0].value, node.value.args[1].value)]
+        return self.generic_visit(node)
+
+
+def _parse_rule_source(expr, mode):
+    """
+    @return: the AST of a rule source (an expression node in eval mode, a list of statements in
+             exec mode) if it passes the rule code checks, else a reference to the undefined
+             name ``_invalid``, which fails at run time like the interpreter would
+    """
+    try:
+        compile_rule_code(expr, mode)
+        if mode == 'eval':
+            return ast.parse(expr.strip(), mode='eval').body
+        return ast.parse(expr, mode='exec').body or [ast.Pass()]
+    except Exception:
+        invalid = ast.Name(id='_invalid', ctx=ast.Load())
+        return invalid if mode == 'eval' else [ast.Expr(value=invalid)]
+
+
+def compile_rule_program(name, rules):
+    """
+    Compile the ordered rules of an execution plan into one straight-line program, run once per
+    contract with the local dict of the rules as globals. On top of the rules local dict, the
+    program uses ``_ld`` (the local dict itself), ``_cats`` (the categories totals), ``_rules``
+    (the applied rules by code), ``_records`` (the rules of the plan), ``_blacklist`` and
+    ``_results``, to which it appends a tuple (rule index, amount, quantity, rate) for every
+    applied rule. ``_step`` tells which step of ``steps`` was running when an error occurs.
+
+    @param rules: a list of dicts of the rule values, with the 'category_codes' of the category
+                  of the rule and its parents and the 'descendants' blacklisted with the rule
+    @return: a tuple (code object validated against the safe_eval opcodes, steps), the steps
+             being tuples (rule index, condition or amount type)
+    """
+    lines = []
+    sources = {}
+    steps = []
+
+    def step(index, part):
+        steps.append((index, part))
+        return "_step = %d" % (len(steps) - 1)
+
+    def expr(index, fname):
+        sources[(index, fname)] = _parse_rule_source(rules[index][fname] or '', 'eval')
+        return "_expr(%d, %r)" % (index, fname)
+
+    def code(index, fname):
+        sources[(index, fname)] = _parse_rule_source(rules[index][fname] or '', 'exec')
+        return "_code(%d, %r)" % (index, fname)
+
+    for index, rule in enumerate(rules):
+        lines += [
+            "# %s" % rule['code'],
+            "result = None",
+            "result_qty = 1.0",
+            "result_rate = 100",
+        ]
+        if rule['condition_select'] == 'range':
+            lines += [
+                step(index, 'range'),
+                "_value = %s" % expr(index, 'condition_range'),
+                "_ok = %r <= _value and _value <= %r or False" % (rule['condition_range_min'], rule['condition_range_max']),
+            ]
+        elif rule['condition_select'] == 'python':
+            lines += [
+                step(index, 'python'),
+                code(index, 'condition_python'),
+                "_ok = result or False",
+            ]
+        else:
+            lines.append("_ok = True")
+        lines += [
+            "if _ok and %d not in _blacklist:" % rule['id'],
+            "    " + step(index, rule['amount_select']),
+        ]
+        if rule['amount_select'] == 'fix':
+            lines.append("    _amount, _qty, _rate = %r, float(%s), 100.0" % (rule['amount_fix'], expr(index, 'quantity')))
+        elif rule['amount_select'] == 'percentage':
+            lines.append("    _amount, _qty, _rate = float(%s), float(%s), %r" % (
+                expr(index, 'amount_percentage_base'), expr(index, 'quantity'), rule['amount_percentage']))
+        else:
+            lines += [
+                "    " + code(index, 'amount_python_compute'),
+                "    _amount, _qty, _rate = float(result), result_qty or 1.0, result_rate or 100.0",
+            ]
+        lines += [
+            "    _previous = _ld.get(%r) or 0.0" % rule['code'],
+            "    _total = _amount * _qty * _rate / 100.0",
+            "    _ld[%r] = _total" % rule['code'],
+            "    _rules[%r] = _records[%d]" % (rule['code'], index),
+            "    _delta = _total - _previous",
+        ]
+        for category_code in rule['category_codes']:
+            lines += [
+                "    if %r in _cats:" % category_code,
+                "        _cats[%r] += _delta" % category_code,
+                "    else:",
+                "        _cats[%r] = _delta" % category_code,
+            ]
+        lines += [
+            "    _results.append((%d, _amount, _qty, _rate))" % index,
+            "else:",
+            "    _blacklist.update(%r)" % (tuple(rule['descendants']),),
+        ]
+    tree = _RuleSourceInliner(sources).visit(ast.parse("\n".join(lines) or "pass", mode='exec'))
+    code_obj = compile(ast.fix_missing_locations(tree), name, 'exec')
+    assert_valid_codeobj(_SAFE_OPCODES, code_obj, name)
+    return code_obj, tuple(steps)
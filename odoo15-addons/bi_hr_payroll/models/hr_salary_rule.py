@@ -1,9 +1,41 @@
 # -*- coding: utf-8 -*-
 # Part of BrowseInfo. See LICENSE file for full copyright and licensing details.
 
-from odoo import api, fields, models, _
+import logging
+from collections import defaultdict
+
+from odoo import api, fields, models, tools, _
 from odoo.exceptions import UserError, ValidationError
-from odoo.tools.safe_eval import safe_eval
+from odoo.tools.cache import get_cache_key_counter
+from odoo.tools.safe_eval import _BUILTINS, check_values, unsafe_eval
+from .hr_rule_engine import (
+    analyse_rule_references, collect_record_fields, compile_rule_code, compile_rule_program, parse_vector_expression,
+)
+
+_logger = logging.getLogger(__name__)
+
+# python source fields of hr.salary.rule evaluated by the payroll engine, with their eval mode
+RULE_CODE_FIELDS = {
+    'quantity': 'eval',
+    'amount_percentage_base': 'eval',
+    'condition_range': 'eval',
+    'condition_python': 'exec',
+    'amount_python_compute': 'exec',
+}
+
+
+def _eval_compiled(code, globals_dict, nocopy=False):
+    """
+    Evaluate a code object validated by ``compile_rule_code``. A namespace of
+    ``make_rule_namespace`` is used as is, any other dict the same way ``safe_eval`` would.
+    """
+    if globals_dict.get('__builtins__') is _BUILTINS:
+        return unsafe_eval(code, globals_dict)
+    if not nocopy:
+        globals_dict = dict(globals_dict)
+    check_values(globals_dict)
+    globals_dict['__builtins__'] = _BUILTINS
+    return unsafe_eval(code, globals_dict)
 
 
 class HrPayrollStructure(models.Model):
@@ -28,6 +60,30 @@ class HrPayrollStructure(models.Model):
     parent_id = fields.Many2one('hr.payroll.structure', string='Parent', default=_get_parent)
     children_ids = fields.One2many('hr.payroll.structure', 'parent_id', string='Children', copy=True)
     rule_ids = fields.Many2many('hr.salary.rule', 'hr_structure_salary_rule_rel', 'struct_id', 'rule_id', string='Salary Rules')
+    rule_graph = fields.Html(string='Rule Dependencies', compute='_compute_rule_graph', sanitize=False,
+        help="Values of the payslip read by each rule of the structure and its parents, found in their code")
+
+    def _compute_rule_graph(self):
+        for structure in self:
+            if not structure.id:
+                structure.rule_graph = False
+                continue
+            plan = self._get_rule_plan((structure.id,))
+            graph = self._get_rule_graph((structure.id,))
+            rules = self.env['hr.salary.rule'].browse(plan['rule_ids'])
+            labels = [('codes', _('Rules')), ('categories', _('Categories')),
+                      ('inputs', _('Inputs')), ('worked_days', _('Worked Days'))]
+            rows = []
+            for rule in rules:
+                references = graph['references'][rule.id]
+                rows.append({
+                    'rule': rule,
+                    'opaque': references['opaque'],
+                    'reads': [(label, ', '.join(sorted(references[kind]))) for kind, label in labels if references[kind]],
+                    'depends': ', '.join(sorted(set(rules.browse(graph['depends'][rule.id]).mapped('code')))),
+                    'warnings': graph['warnings'].get(rule.id, []),
+                })
+            structure.rule_graph = self.env['ir.qweb']._render('bi_hr_payroll.rule_dependency_graph', {'rows': rows})
 
     @api.constrains('parent_id')
     def _check_parent_id(self):
@@ -55,6 +111,220 @@ class HrPayrollStructure(models.Model):
             parent = parent._get_parent_structure()
         return parent + self
 
+    @api.model_create_multi
+    def create(self, vals_list):
+        self.clear_caches()
+        return super(HrPayrollStructure, self).create(vals_list)
+
+    def write(self, vals):
+        self.clear_caches()
+        return super(HrPayrollStructure, self).write(vals)
+
+    def unlink(self):
+        self.clear_caches()
+        return super(HrPayrollStructure, self).unlink()
+
+    @api.model
+    @tools.ormcache('structure_ids')
+    def _get_rule_plan(self, structure_ids):
+        """
+        Execution plan of the rules of the given structures and their parents. The plan only
+        depends on the structures, rules and categories, and is dropped (in every worker, through
+        the registry cache signaling) as soon as one of them is modified.
+
+        @param structure_ids: sorted tuple of structure ids
+        @return: a dict with
+                 - 'structure_ids': the ids of the structures and their parents
+                 - 'rule_ids': the ids of the rules to apply, ordered by sequence
+                 - 'descendants': the ids of each rule and its children, blacklisted when the rule
+                   is not applied
+                 - 'category_codes': the codes of each category and its parents, root first
+                 - 'write_dates': the write dates of the structures, rules and categories, the
+                   version of the plan the compiled rule programs are cached by
+                 - 'record_fields': the fields of 'contract' and 'employee' read by the rules
+        """
+        # structures sharing a parent at different depths give it several times
+        structures = self.sudo().browse(structure_ids)._get_parent_structure()
+        structures = structures.browse(sorted(set(structures.ids)))
+        rule_ids = structures.get_all_rules()
+        sorted_rule_ids = tuple(id for id, sequence in sorted(rule_ids, key=lambda x: x[1]))
+        rules = self.env['hr.salary.rule'].sudo().browse(sorted_rule_ids)
+        descendants = {
+            rule.id: tuple(id for id, sequence in rule._recursive_search_of_rules())
+            for rule in rules
+        }
+        categories = rules.mapped('category_id')
+        ancestor_ids = {category.id: category._get_ancestor_ids() for category in categories}
+        ancestor_codes = {
+            ancestor.id: ancestor.code for ancestor in categories.browse({id for ids in ancestor_ids.values() for id in ids})
+        }
+        category_codes = {
+            category_id: tuple(ancestor_codes[id] for id in ids) for category_id, ids in ancestor_ids.items()
+        }
+        write_dates = tuple(
+            (record._name, record.id, str(record.write_date))
+            for records in (structures, rules, rules.mapped('category_id')) for record in records
+        )
+        attributes = collect_record_fields([
+            (rule[fname], RULE_CODE_FIELDS[fname]) for rule in rules for fname in rule._get_code_fields()
+        ])
+        record_models = {'contract': self.env['hr.contract'], 'employee': self.env['hr.employee']}
+        record_fields = {
+            name: tuple(sorted(fname for fname in attributes[name] if fname in model._fields))
+            for name, model in record_models.items()
+        }
+        return {
+            'structure_ids': tuple(sorted(set(structures.ids))),
+            'rule_ids': sorted_rule_ids,
+            'descendants': descendants,
+            'category_codes': category_codes,
+            'write_dates': write_dates,
+            'record_fields': record_fields,
+        }
+
+    @api.model
+    @tools.ormcache('structure_ids')
+    def _get_rule_graph(self, structure_ids):
+        """
+        Dependency graph of the rules of the plan of the given structures, from the static
+        analysis of their code. A rule depends on the rules whose code it reads (bare or through
+        ``rules``), on the rules of the categories it reads, on its parent rules which blacklist
+        it, on the previous rules of the same code whose amount it replaces in the categories, and
+        on the rules setting the other names it reads in the local dict.
+        Categories and ``rules`` are shared by the contracts of a payslip, so a rule also depends
+        on the rules running after it.
+
+        @param structure_ids: sorted tuple of structure ids
+        @return: a dict with
+                 - 'references': {rule id: the references of the rule, see analyse_rule_references}
+                 - 'depends': {rule id: frozenset of the ids of the rules it depends on}
+                 - 'warnings': {rule id: messages about the codes the rule reads before they are computed}
+                 - 'replayable': whether the rules can be replayed from the payslip lines, i.e. no two
+                   rules of the plan share a code and so every applied rule has its line
+        """
+        plan = self._get_rule_plan(structure_ids)
+        rules = self.env['hr.salary.rule'].sudo().browse(plan['rule_ids'])
+        position = {rule_id: index for index, rule_id in enumerate(plan['rule_ids'])}
+        code_rules = defaultdict(list)
+        category_rules = defaultdict(list)
+        parent_rules = defaultdict(set)
+        store_rules = defaultdict(list)
+        rule_references = {}
+        for rule in rules:
+            rule_references[rule.id] = analyse_rule_references([
+                (rule[fname], RULE_CODE_FIELDS[fname]) for fname in rule._get_code_fields()
+            ])
+            for name in rule_references[rule.id]['stores']:
+                store_rules[name].append(rule.id)
+            code_rules[rule.code].append(rule.id)
+            for code in plan['category_codes'][rule.category_id.id]:
+                category_rules[code].append(rule.id)
+            for descendant_id in plan['descendants'][rule.id]:
+                if descendant_id != rule.id:
+                    parent_rules[descendant_id].add(rule.id)
+        depends = {}
+        warnings = defaultdict(list)
+        for rule in rules:
+            references = rule_references[rule.id]
+            codes = references['codes'] | (references['names'] & set(code_rules))
+            rule_depends = set(parent_rules[rule.id])
+            rule_depends.update(id for id in code_rules[rule.code] if position[id] < position[rule.id])
+            # names set in the local dict of the contract by the code of other rules
+            for name in references['names'] - set(code_rules):
+                rule_depends.update(store_rules.get(name, []))
+            for code in codes:
+                if not code_rules.get(code):
+                    warnings[rule.id].append(_('reads the code %s, which no rule of the structure computes') % code)
+                elif all(position[id] >= position[rule.id] for id in code_rules[code]):
+                    warnings[rule.id].append(_('reads the code %s before it is computed') % code)
+                rule_depends.update(code_rules.get(code, []))
+            for code in references['categories']:
+                if any(position[id] > position[rule.id] for id in category_rules.get(code, [])):
+                    warnings[rule.id].append(_('reads the category %s before all its rules are computed') % code)
+                rule_depends.update(category_rules.get(code, []))
+            rule_depends.discard(rule.id)
+            rule_references[rule.id] = dict(references, codes=frozenset(codes))
+            depends[rule.id] = frozenset(rule_depends)
+        for rule_id, messages in warnings.items():
+            for message in messages:
+                _logger.warning("Salary rule %s %s", rules.browse(rule_id).code, message)
+        return {
+            'references': rule_references,
+            'depends': depends,
+            'warnings': dict(warnings),
+            'replayable': all(len(ids) == 1 for ids in code_rules.values()),
+        }
+
+    @api.model
+    def _get_dirty_rules(self, structure_ids, input_codes):
+        """
+        @param input_codes: the codes of the payslip inputs which changed
+        @return: the set of the ids of the rules of the plan to evaluate again, the rules reading
+                 the inputs, the rules depending on them, and the rules that can not be followed or
+                 set names in the local dict (which are not kept between computations)
+        """
+        plan = self._get_rule_plan(structure_ids)
+        graph = self._get_rule_graph(structure_ids)
+        dirty = set()
+        changed = True
+        while changed:
+            changed = False
+            for rule_id in plan['rule_ids']:
+                if rule_id in dirty:
+                    continue
+                references = graph['references'][rule_id]
+                if references['opaque'] or references['stores'] or references['inputs'] & input_codes \
+                        or graph['depends'][rule_id] & dirty:
+                    dirty.add(rule_id)
+                    changed = True
+        return dirty
+
+    @api.model
+    def _get_rule_program(self, structure_ids):
+        """
+        @param structure_ids: sorted tuple of structure ids
+        @return: the compiled program of the rule plan of the given structures (see
+                 ``compile_rule_program``), or None when it can not be compiled
+        """
+        plan = self._get_rule_plan(structure_ids)
+        return self._compile_rule_program(structure_ids, plan['write_dates'])
+
+    @api.model
+    @tools.ormcache('structure_ids', 'write_dates')
+    def _compile_rule_program(self, structure_ids, write_dates):
+        plan = self._get_rule_plan(structure_ids)
+        rules = self.env['hr.salary.rule'].sudo().browse(plan['rule_ids'])
+        fnames = [
+            'code', 'condition_select', 'condition_range', 'condition_python', 'condition_range_min',
+            'condition_range_max', 'amount_select', 'amount_fix', 'amount_percentage',
+            'amount_percentage_base', 'quantity', 'amount_python_compute',
+        ]
+        rules_values = [dict(
+            {fname: rule[fname] for fname in fnames},
+            id=rule.id,
+            category_codes=plan['category_codes'][rule.category_id.id],
+            descendants=plan['descendants'][rule.id],
+        ) for rule in rules]
+        name = '<salary structures %s>' % ','.join(str(id) for id in plan['structure_ids'])
+        try:
+            code, steps = compile_rule_program(name, rules_values)
+        except Exception:
+            _logger.warning("Could not compile the rules of %s, they are interpreted", name, exc_info=True)
+            return None
+        return {'code': code, 'steps': steps}
+
+    @api.model
+    @tools.ormcache('structure_ids')
+    def _get_input_templates(self, structure_ids):
+        """
+        @param structure_ids: sorted tuple of structure ids
+        @return: a tuple of (name, code) of the inputs of the rules of the given structures and
+                 their parents, ordered by rule sequence
+        """
+        plan = self._get_rule_plan(structure_ids)
+        inputs = self.env['hr.salary.rule'].sudo().browse(plan['rule_ids']).mapped('input_ids')
+        return tuple((input.name, input.code) for input in inputs)
+
 
 class HrContributionRegister(models.Model):
     _name = 'hr.contribution.register'
@@ -72,12 +342,14 @@ class HrContributionRegister(models.Model):
 class HrSalaryRuleCategory(models.Model):
     _name = 'hr.salary.rule.category'
     _description = 'Salary Rule Category'
+    _parent_store = True
 
     name = fields.Char(required=True, translate=True)
     code = fields.Char(required=True)
     parent_id = fields.Many2one('hr.salary.rule.category', string='Parent',
         help="Linking a salary category to its parent is used only for the reporting purpose.")
     children_ids = fields.One2many('hr.salary.rule.category', 'parent_id', string='Children')
+    parent_path = fields.Char(index=True)
     note = fields.Text(string='Description')
     company_id = fields.Many2one('res.company', string='Company',
         default=lambda self: self.env['res.company']._company_default_get())
@@ -87,6 +359,49 @@ class HrSalaryRuleCategory(models.Model):
         if not self._check_recursion():
             raise ValidationError(_('Error! You cannot create recursive hierarchy of Salary Rule Category.'))
 
+    @api.model_create_multi
+    def create(self, vals_list):
+        self.clear_caches()
+        return super(HrSalaryRuleCategory, self).create(vals_list)
+
+    def write(self, vals):
+        self.clear_caches()
+        return super(HrSalaryRuleCategory, self).write(vals)
+
+    def unlink(self):
+        self.clear_caches()
+        return super(HrSalaryRuleCategory, self).unlink()
+
+    def _get_ancestor_ids(self):
+        """ @return: the ids of the parents of the category and of the category, root first """
+        self.ensure_one()
+        return [int(id) for id in self.parent_path.split('/')[:-1]]
+
+
+class HrSalaryRuleCategoryAncestor(models.Model):
+    """
+    Closure of the category hierarchy: a row by category and each of its parents (and itself),
+    read from the parent path maintained on the categories, for the reports to join directly.
+    """
+    _name = 'hr.salary.rule.category.ancestor'
+    _description = 'Salary Rule Category Ancestor'
+    _auto = False
+    _order = 'category_id, level'
+
+    category_id = fields.Many2one('hr.salary.rule.category', string='Category', readonly=True)
+    ancestor_id = fields.Many2one('hr.salary.rule.category', string='Ancestor', readonly=True)
+    level = fields.Integer(readonly=True, help="Depth of the ancestor in the hierarchy, 0 for the root categories")
+
+    def init(self):
+        tools.drop_view_if_exists(self.env.cr, self._table)
+        self.env.cr.execute("""
+            CREATE OR REPLACE VIEW hr_salary_rule_category_ancestor AS (
+                SELECT row_number() OVER (ORDER BY rc.id, path.level) AS id, rc.id AS category_id,
+                    path.ancestor_id::integer AS ancestor_id, (path.level - 1)::integer AS level
+                FROM hr_salary_rule_category AS rc,
+                    unnest(string_to_array(rtrim(rc.parent_path, '/'), '/')) WITH ORDINALITY AS path(ancestor_id, level)
+            )""")
+
 
 class HrSalaryRule(models.Model):
     _name = 'hr.salary.rule'
@@ -132,6 +447,8 @@ class HrSalaryRule(models.Model):
                     # categories: object containing the computed salary rule categories (sum of amount of all rules belonging to that category).
                     # worked_days: object containing the computed worked days
                     # inputs: object containing the computed inputs
+                    # ytd: year to date totals of the done payslips (ytd.BASIC, ytd.category('ALW'), ytd.count('BASIC'))
+                    # brackets: progressive taxes and PTKP (brackets.tax('PPH21', taxable), brackets.ptkp(contract))
 
                     # Note: returned value have to be set in the variable 'result'
 
@@ -158,6 +475,8 @@ class HrSalaryRule(models.Model):
                     # categories: object containing the computed salary rule categories (sum of amount of all rules belonging to that category).
                     # worked_days: object containing the computed worked days.
                     # inputs: object containing the computed inputs.
+                    # ytd: year to date totals of the done payslips (ytd.BASIC, ytd.category('ALW'), ytd.count('BASIC'))
+                    # brackets: progressive taxes and PTKP (brackets.tax('PPH21', taxable), brackets.ptkp(contract))
 
                     # Note: returned value have to be set in the variable 'result'
 
@@ -175,6 +494,36 @@ class HrSalaryRule(models.Model):
         if not self._check_recursion(parent='parent_rule_id'):
             raise ValidationError(_('Error! You cannot create recursive hierarchy of Salary Rules.'))
 
+    def _get_code_fields(self):
+        """ @return: the python source fields run by the engine given the condition and amount types of the rule """
+        self.ensure_one()
+        fnames = []
+        if self.condition_select == 'range':
+            fnames.append('condition_range')
+        elif self.condition_select == 'python':
+            fnames.append('condition_python')
+        if self.amount_select in ('fix', 'percentage'):
+            fnames.append('quantity')
+        if self.amount_select == 'percentage':
+            fnames.append('amount_percentage_base')
+        elif self.amount_select == 'code':
+            fnames.append('amount_python_compute')
+        return fnames
+
+    @api.constrains('condition_select', 'condition_range', 'condition_python', 'amount_select',
+                    'quantity', 'amount_percentage_base', 'amount_python_compute')
+    def _check_rule_code(self):
+        # hr.payslip.line inherits this model, only the code of the rules is run
+        if self._name != 'hr.salary.rule':
+            return
+        for rule in self:
+            for fname in rule._get_code_fields():
+                try:
+                    compile_rule_code(rule[fname] or '', RULE_CODE_FIELDS[fname])
+                except (SyntaxError, ValueError) as e:
+                    raise ValidationError(_('Wrong %s defined for salary rule %s (%s): %s') % (
+                        rule._fields[fname].string, rule.name, rule.code, e))
+
     def _recursive_search_of_rules(self):
         """
         @return: returns a list of tuple (id, sequence) which are all the children of the passed rule_ids
@@ -184,27 +533,115 @@ class HrSalaryRule(models.Model):
             children_rules += rule.child_ids._recursive_search_of_rules()
         return [(rule.id, rule.sequence) for rule in self] + children_rules
 
+    @api.model_create_multi
+    def create(self, vals_list):
+        # hr.payslip.line inherits this model, only rule changes may invalidate the payroll caches
+        if self._name == 'hr.salary.rule':
+            self.clear_caches()
+        return super(HrSalaryRule, self).create(vals_list)
+
+    def write(self, vals):
+        res = super(HrSalaryRule, self).write(vals)
+        if self._name == 'hr.salary.rule':
+            self.clear_caches()
+            self.env['hr.payslip']._invalidate_compute_fingerprints(self)
+        return res
+
+    def unlink(self):
+        res = super(HrSalaryRule, self).unlink()
+        if self._name == 'hr.salary.rule':
+            self.clear_caches()
+        return res
+
+    @api.model
+    @tools.ormcache('rule_id', 'fname', 'write_date')
+    def _get_compiled_code(self, rule_id, fname, write_date, expr):
+        """
+        @return: the code object of the python source ``expr`` stored in the field ``fname``
+                 of the rule, checked against the rule syntax and the safe_eval opcodes once
+                 per rule version
+        """
+        return compile_rule_code(expr, RULE_CODE_FIELDS[fname])
+
+    @api.model
+    def _get_code_cache_stats(self):
+        """
+        @return: the hit/miss counters of the compiled code cache of the current worker
+        """
+        counter = get_cache_key_counter(self._get_compiled_code, 0, False, False, False)[2]
+        return {'hit': counter.hit, 'miss': counter.miss, 'err': counter.err}
+
+    @api.model
+    @tools.ormcache('expr')
+    def _get_vector_expression(self, expr):
+        """
+        @return: the expression tree of the python source ``expr`` for the vectorized engine, or
+                 None when it has to be evaluated by the scalar engine
+        """
+        numeric_fields = frozenset(
+            name for name, field in self.env['hr.contract']._fields.items() if field.type in ('float', 'monetary'))
+        return parse_vector_expression(expr, numeric_fields)
+
+    def _get_vector_program(self):
+        """
+        @return: a dict {field name: expression tree} of the expressions of a fixed or percentage
+                 rule without python condition, or None when the rule runs on the scalar engine
+        """
+        self.ensure_one()
+        if self.condition_select not in ('none', 'range') or self.amount_select not in ('fix', 'percentage'):
+            return None
+        fnames = ['quantity']
+        if self.condition_select == 'range':
+            fnames.append('condition_range')
+        if self.amount_select == 'percentage':
+            fnames.append('amount_percentage_base')
+        program = {fname: self._get_vector_expression(self[fname]) for fname in fnames}
+        if not all(program.values()):
+            return None
+        return program
+
+    def _eval_code(self, fname, localdict, nocopy=False):
+        self.ensure_one()
+        code = self._get_compiled_code(self.id, fname, self.write_date, self[fname])
+        return _eval_compiled(code, localdict, nocopy=nocopy)
+
+    def _get_rule_error(self, part):
+        """
+        @param part: the condition type or amount type of the rule which failed
+        @return: the error message of the rule
+        """
+        self.ensure_one()
+        if part == 'fix':
+            return _('Wrong quantity defined for salary rule %s (%s).') % (self.name, self.code)
+        elif part == 'percentage':
+            return _('Wrong percentage base or quantity defined for salary rule %s (%s).') % (self.name, self.code)
+        elif part == 'code':
+            return _('Wrong python code defined for salary rule %s (%s).') % (self.name, self.code)
+        elif part == 'range':
+            return _('Wrong range condition defined for salary rule %s (%s).') % (self.name, self.code)
+        return _('Wrong python condition defined for salary rule %s (%s).') % (self.name, self.code)
+
     #TODO should add some checks on the type of result (should be float)
     def _compute_rule(self, localdict):
         self.ensure_one()
         if self.amount_select == 'fix':
             try:
-                return self.amount_fix, float(safe_eval(self.quantity, localdict)), 100.0
+                return self.amount_fix, float(self._eval_code('quantity', localdict)), 100.0
             except:
-                raise UserError(_('Wrong quantity defined for salary rule %s (%s).') % (self.name, self.code))
+                raise UserError(self._get_rule_error('fix'))
         elif self.amount_select == 'percentage':
             try:
-                return (float(safe_eval(self.amount_percentage_base, localdict)),
-                        float(safe_eval(self.quantity, localdict)),
+                return (float(self._eval_code('amount_percentage_base', localdict)),
+                        float(self._eval_code('quantity', localdict)),
                         self.amount_percentage)
             except:
-                raise UserError(_('Wrong percentage base or quantity defined for salary rule %s (%s).') % (self.name, self.code))
+                raise UserError(self._get_rule_error('percentage'))
         else:
             try:
-                safe_eval(self.amount_python_compute, localdict, mode='exec', nocopy=True)
+                self._eval_code('amount_python_compute', localdict, nocopy=True)
                 return float(localdict['result']), 'result_qty' in localdict and localdict['result_qty'] or 1.0, 'result_rate' in localdict and localdict['result_rate'] or 100.0
             except:
-                raise UserError(_('Wrong python code defined for salary rule %s (%s).') % (self.name, self.code))
+                raise UserError(self._get_rule_error('code'))
 
     def _satisfy_condition(self, localdict):
         self.ensure_one()
@@ -213,16 +650,16 @@ class HrSalaryRule(models.Model):
             return True
         elif self.condition_select == 'range':
             try:
-                result = safe_eval(self.condition_range, localdict)
+                result = self._eval_code('condition_range', localdict)
                 return self.condition_range_min <= result and result <= self.condition_range_max or False
             except:
-                raise UserError(_('Wrong range condition defined for salary rule %s (%s).') % (self.name, self.code))
+                raise UserError(self._get_rule_error('range'))
         else:  # python code
             try:
-                safe_eval(self.condition_python, localdict, mode='exec', nocopy=True)
+                self._eval_code('condition_python', localdict, nocopy=True)
                 return 'result' in localdict and localdict['result'] or False
             except:
-                raise UserError(_('Wrong python condition defined for salary rule %s (%s).') % (self.name, self.code))
+                raise UserError(self._get_rule_error('python'))
 
 
 class HrRuleInput(models.Model):
@@ -232,3 +669,16 @@ class HrRuleInput(models.Model):
     name = fields.Char(string='Description', required=True)
     code = fields.Char(required=True, help="The code that can be used in the salary rules")
     input_id = fields.Many2one('hr.salary.rule', string='Salary Rule Input', required=True)
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        self.clear_caches()
+        return super(HrRuleInput, self).create(vals_list)
+
+    def write(self, vals):
+        self.clear_caches()
+        return super(HrRuleInput, self).write(vals)
+
+    def unlink(self):
+        self.clear_caches()
+        return super(HrRuleInput, self).unlink()
@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+# Part of BrowseInfo. See LICENSE file for full copyright and licensing details.
+
+from bisect import bisect_right
+
+from odoo import api, fields, models, tools, _
+from odoo.exceptions import UserError
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class TaxBrackets(object):
+    """
+    Progressive tax evaluator given to the salary rules as ``brackets``:
+    ``brackets.tax('PPH21', taxable)`` and ``brackets.ptkp(contract)``
+    """
+
+    def __init__(self, env):
+        self.env = env
+
+    def tax(self, code, taxable):
+        """ @return: the tax of the bracket table ``code`` on the given taxable amount """
+        return self.env['hr.tax.bracket.table']._compute_tax(code, taxable)
+
+    def tax_batch(self, code, taxables):
+        """ @return: the list of the taxes of the bracket table ``code`` on the given taxable amounts """
+        return self.env['hr.tax.bracket.table']._compute_tax_batch(code, taxables)
+
+    def ptkp(self, contract_or_code):
+        """ @return: the non taxable income (PTKP) of a contract, or of a PTKP status code such as 'K/1' """
+        if isinstance(contract_or_code, str):
+            return self.env['hr.ptkp']._get_amounts().get(contract_or_code, 0.0)
+        # a contract record, or the contract values given to the rules
+        return contract_or_code.ptkp_id.amount
+
+
+class HrTaxBracketTable(models.Model):
+    _name = 'hr.tax.bracket.table'
+    _description = 'Tax Bracket Table'
+
+    name = fields.Char(required=True)
+    code = fields.Char(required=True, help="The code used in the salary rules, like brackets.tax('PPH21', taxable)")
+    active = fields.Boolean(default=True)
+    line_ids = fields.One2many('hr.tax.bracket.table.line', 'table_id', string='Brackets', copy=True)
+    note = fields.Text(string='Description')
+
+    _sql_constraints = [
+        ('code_uniq', 'unique(code)', 'The code of a tax bracket table must be unique.'),
+    ]
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        self.clear_caches()
+        return super(HrTaxBracketTable, self).create(vals_list)
+
+    def write(self, vals):
+        res = super(HrTaxBracketTable, self).write(vals)
+        self.clear_caches()
+        return res
+
+    def unlink(self):
+        self.clear_caches()
+        return super(HrTaxBracketTable, self).unlink()
+
+    @api.model
+    @tools.ormcache('code')
+    def _get_brackets(self, code):
+        """
+        @return: a tuple (lower bounds, rates, cumulative taxes) of the brackets of the table,
+                 the cumulative tax being the tax due at the lower bound of each bracket
+        """
+        table = self.sudo().search([('code', '=', code)], limit=1)
+        if not table:
+            raise UserError(_('No tax bracket table with code %s.') % code)
+        lines = table.line_ids.sorted('lower_bound')
+        return (
+            tuple(lines.mapped('lower_bound')),
+            tuple(lines.mapped('rate')),
+            tuple(lines.mapped('cumulative_tax')),
+        )
+
+    @api.model
+    def _compute_tax(self, code, taxable):
+        lower_bounds, rates, cumulative_taxes = self._get_brackets(code)
+        index = bisect_right(lower_bounds, taxable) - 1
+        if index < 0:
+            return 0.0
+        return cumulative_taxes[index] + (taxable - lower_bounds[index]) * rates[index] / 100.0
+
+    @api.model
+    def _compute_tax_batch(self, code, taxables):
+        """ Evaluate the table on many taxable amounts at once, with numpy when it is installed """
+        if numpy is None:
+            return [self._compute_tax(code, taxable) for taxable in taxables]
+        lower_bounds, rates, cumulative_taxes = self._get_brackets(code)
+        if not lower_bounds:
+            return [0.0] * len(taxables)
+        taxables = numpy.asarray(taxables, dtype=float)
+        lower_bounds = numpy.asarray(lower_bounds, dtype=float)
+        indexes = numpy.searchsorted(lower_bounds, taxables, side='right') - 1
+        below = indexes < 0
+        indexes[below] = 0
+        taxes = numpy.asarray(cumulative_taxes)[indexes] + \
+            (taxables - lower_bounds[indexes]) * numpy.asarray(rates)[indexes] / 100.0
+        taxes[below] = 0.0
+        return taxes.tolist()
+
+
+class HrTaxBracketTableLine(models.Model):
+    _name = 'hr.tax.bracket.table.line'
+    _description = 'Tax Bracket'
+    _order = 'table_id, lower_bound'
+
+    table_id = fields.Many2one('hr.tax.bracket.table', string='Table', required=True, ondelete='cascade')
+    lower_bound = fields.Float(string='From', digits='Payroll', required=True,
+        help="Taxable amount from which the rate applies, up to the lower bound of the next bracket")
+    rate = fields.Float(string='Rate (%)', digits='Payroll Rate', required=True)
+    cumulative_tax = fields.Float(compute='_compute_cumulative_tax', store=True, digits='Payroll',
+        help="Tax due on the taxable amount below this bracket")
+
+    @api.depends('table_id.line_ids.lower_bound', 'table_id.line_ids.rate')
+    def _compute_cumulative_tax(self):
+        for table in self.mapped('table_id'):
+            cumulative_tax = 0.0
+            previous = None
+            for line in table.line_ids.sorted('lower_bound'):
+                if previous is not None:
+                    cumulative_tax += (line.lower_bound - previous.lower_bound) * previous.rate / 100.0
+                line.cumulative_tax = cumulative_tax
+                previous = line
+        for line in self.filtered(lambda line: not line.table_id):
+            line.cumulative_tax = 0.0
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        self.clear_caches()
+        return super(HrTaxBracketTableLine, self).create(vals_list)
+
+    def write(self, vals):
+        res = super(HrTaxBracketTableLine, self).write(vals)
+        self.clear_caches()
+        return res
+
+    def unlink(self):
+        self.clear_caches()
+        return super(HrTaxBracketTableLine, self).unlink()
+
+
+class HrPtkp(models.Model):
+    _name = 'hr.ptkp'
+    _description = 'Non Taxable Income (PTKP)'
+    _order = 'code'
+
+    name = fields.Char(required=True)
+    code = fields.Char(required=True, help="Marital status and number of dependents, like TK/0 or K/1")
+    amount = fields.Float(digits='Payroll', required=True, help="Yearly non taxable income")
+
+    _sql_constraints = [
+        ('code_uniq', 'unique(code)', 'The code of a PTKP status must be unique.'),
+    ]
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        self.clear_caches()
+        return super(HrPtkp, self).create(vals_list)
+
+    def write(self, vals):
+        res = super(HrPtkp, self).write(vals)
+        self.clear_caches()
+        return res
+
+    def unlink(self):
+        self.clear_caches()
+        return super(HrPtkp, self).unlink()
+
+    @api.model
+    @tools.ormcache()
+    def _get_amounts(self):
+        """ @return: a dict {code: yearly amount} of the PTKP statuses """
+        return {ptkp.code: ptkp.amount for ptkp in self.sudo().search([])}
@@ -11,3 +11,22 @@ class ResConfigSettings(models.TransientModel):
     module_l10n_fr_hr_payroll = fields.Boolean(string='French Payroll')
     module_l10n_be_hr_payroll = fields.Boolean(string='Belgium Payroll')
     module_l10n_in_hr_payroll = fields.Boolean(string='Indian Payroll')
+    payslip_run_workers = fields.Integer(string='Payslip Batch Workers',
+        config_parameter='bi_hr_payroll.payslip_run_workers',
+        help="0 computes the payslips of a batch in a single transaction. From 1, the batch is split in "
+             "chunks committed one by one by a scheduled action, and with more than one worker the chunks "
+             "are computed by a pool of processes.")
+    payslip_run_chunk_size = fields.Integer(string='Payslip Batch Chunk Size', default=200,
+        config_parameter='bi_hr_payroll.payslip_run_chunk_size',
+        help="Number of employees per chunk of a payslip batch.")
+    payslip_run_queued = fields.Boolean(string='Payslip Batches in Background',
+        config_parameter='bi_hr_payroll.payslip_run_queued',
+        help="Generate the payslips of batches in background by default.")
+    rule_engine_vectorized = fields.Boolean(string='Vectorized Rule Engine',
+        config_parameter='bi_hr_payroll.rule_engine_vectorized',
+        help="Evaluate the fixed and percentage rules without python condition on all the payslips "
+             "of a computation at once with numpy. Requires the numpy python library.")
+    rule_engine_interpreted = fields.Boolean(string='Interpret the Salary Rules',
+        config_parameter='bi_hr_payroll.rule_engine_interpreted',
+        help="Evaluate the salary rules one by one instead of running the compiled program of the "
+             "salary structures, to debug the rules.")
@@ -9,25 +9,70 @@ from odoo import api, fields, models, _
 from odoo.exceptions import UserError
 
 
+# number of payslip lines fetched at once from the server-side cursors
+FETCH_PAGE_SIZE = 1000
+
+
+class PayslipLinesPages(object):
+    """
+    Payslip lines of a contribution register within a period, as dicts. Each iteration streams
+    the lines from a server-side cursor, page by page, instead of loading them all. The lines of
+    the credit notes count negatively, as in the payroll summary giving the register totals.
+    """
+
+    def __init__(self, cr, register_id, date_from, date_to, page_size=FETCH_PAGE_SIZE):
+        self.cr = cr
+        self.register_id = register_id
+        self.date_from = date_from
+        self.date_to = date_to
+        self.page_size = page_size
+
+    def __iter__(self):
+        cursor_name = 'contribution_register_lines_%s' % self.register_id
+        self.cr.execute("""
+            DECLARE %s NO SCROLL CURSOR FOR
+            SELECT hp.name AS slip_name, pl.code, pl.name, pl.quantity,
+                case when hp.credit_note = False then (pl.amount) else (-pl.amount) end AS amount,
+                case when hp.credit_note = False then (pl.total) else (-pl.total) end AS total
+            FROM hr_payslip_line as pl
+            LEFT JOIN hr_payslip AS hp on (pl.slip_id = hp.id)
+            WHERE (hp.date_from >= %%s) AND (hp.date_to <= %%s)
+            AND pl.register_id = %%s
+            AND hp.state = 'done'
+            ORDER BY pl.slip_id, pl.sequence""" % cursor_name,
+            (self.date_from, self.date_to, self.register_id))
+        try:
+            while True:
+                self.cr.execute("FETCH %d FROM %s" % (self.page_size, cursor_name))
+                rows = self.cr.dictfetchall()
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            self.cr.execute("CLOSE %s" % cursor_name)
+
+
 class ContributionRegisterReport(models.AbstractModel):
-    _name = 'report.hr_payroll.report_contributionregister'
+    _name = 'report.bi_hr_payroll.report_contributionregister'
     _description = 'Payroll Contribution Register Report'
 
     def _get_payslip_lines(self, register_ids, date_from, date_to):
-        result = {}
-        self.env.cr.execute("""
-            SELECT pl.id from hr_payslip_line as pl
-            LEFT JOIN hr_payslip AS hp on (pl.slip_id = hp.id)
-            WHERE (hp.date_from >= %s) AND (hp.date_to <= %s)
-            AND pl.register_id in %s
-            AND hp.state = 'done'
-            ORDER BY pl.slip_id, pl.sequence""",
+        """ @return: a dict {register_id: PayslipLinesPages} streaming the lines of each register """
+        self.env['hr.payslip.line'].flush(['slip_id', 'register_id', 'sequence', 'code', 'name', 'quantity', 'amount', 'total'])
+        self.env['hr.payslip'].flush(['name', 'date_from', 'date_to', 'state', 'credit_note'])
+        return {
+            register_id: PayslipLinesPages(self.env.cr, register_id, date_from, date_to)
+            for register_id in register_ids
+        }
+
+    def _get_payslip_lines_totals(self, register_ids, date_from, date_to):
+        """ @return: a dict {register_id: (number of lines, signed total)} of the lines of each register """
+        if not register_ids:
+            return {}
+        totals = self.env['hr.payroll.summary']._read_totals(
+            ['register_id'], "(s.date_from >= %s) AND (s.date_to <= %s) AND s.register_id in %s",
             (date_from, date_to, tuple(register_ids)))
-        line_ids = [x[0] for x in self.env.cr.fetchall()]
-        for line in self.env['hr.payslip.line'].browse(line_ids):
-            result.setdefault(line.register_id.id, self.env['hr.payslip.line'])
-            result[line.register_id.id] += line
-        return result
+        return {register_id: (count, total) for register_id, count, total in totals}
 
     @api.model
     def _get_report_values(self, docids, data=None):
@@ -38,16 +83,18 @@ class ContributionRegisterReport(models.AbstractModel):
         contrib_registers = self.env['hr.contribution.register'].browse(register_ids)
         date_from = data['form'].get('date_from', fields.Date.today())
         date_to = data['form'].get('date_to', str(datetime.now() + relativedelta(months=+1, day=1, days=-1))[:10])
-        lines_data = self._get_payslip_lines(register_ids, date_from, date_to)
-        lines_total = {}
-        for register in contrib_registers:
-            lines = lines_data.get(register.id)
-            lines_total[register.id] = lines and sum(lines.mapped('total')) or 0.0
+        totals_only = data['form'].get('totals_only')
+        lines_data = {} if totals_only else self._get_payslip_lines(register_ids, date_from, date_to)
+        totals = self._get_payslip_lines_totals(register_ids, date_from, date_to)
+        lines_total = {register_id: totals.get(register_id, (0, 0.0))[1] for register_id in register_ids}
+        lines_count = {register_id: totals.get(register_id, (0, 0.0))[0] for register_id in register_ids}
         return {
             'doc_ids': register_ids,
             'doc_model': 'hr.contribution.register',
             'docs': contrib_registers,
             'data': data,
+            'totals_only': totals_only,
             'lines_data': lines_data,
-            'lines_total': lines_total
+            'lines_total': lines_total,
+            'lines_count': lines_count,
         }
@@ -4,85 +4,70 @@
 from odoo import api, models
 
 class PayslipDetailsReport(models.AbstractModel):
-    _name = 'report.hr_payroll.report_payslipdetails'
+    _name = 'report.bi_hr_payroll.report_payslipdetails'
     _description = 'Payslip Details Report'
 
-    def get_details_by_rule_category(self, payslip_lines):
-        PayslipLine = self.env['hr.payslip.line']
-        RuleCateg = self.env['hr.salary.rule.category']
-
-        def get_recursive_parent(current_rule_category, rule_categories=None):
-            if rule_categories:
-                rule_categories = current_rule_category | rule_categories
-            else:
-                rule_categories = current_rule_category
-
-            if current_rule_category.parent_id:
-                return get_recursive_parent(current_rule_category.parent_id, rule_categories)
-            else:
-                return rule_categories
-
+    def get_details_by_rule_category(self, payslips):
+        """
+        @return: a dict {payslip_id: list of dicts} of the lines appearing on the payslips, each
+                 category preceded by its parents (root first) with the total of its lines
+        """
         res = {}
+        if not payslips:
+            return res
+        self.env['hr.payslip.line'].flush(['slip_id', 'category_id', 'appears_on_payslip', 'sequence', 'name', 'code', 'total'])
+        self.env['hr.salary.rule.category'].flush(['parent_id'])
+        # categories of the lines, preceded by their parents, from the closure of the categories
+        self.env.cr.execute("""
+            SELECT ca.category_id, ca.ancestor_id FROM hr_salary_rule_category_ancestor AS ca
+            WHERE ca.category_id IN (
+                SELECT DISTINCT pl.category_id FROM hr_payslip_line AS pl
+                WHERE pl.slip_id IN %s AND pl.appears_on_payslip)
+            ORDER BY ca.category_id, ca.level""",
+            (tuple(payslips.ids),))
+        category_parents = {}
+        for category_id, parent_id in self.env.cr.fetchall():
+            category_parents.setdefault(category_id, []).append(parent_id)
+        # category names are translated
+        categories = {
+            category.id: category
+            for category in self.env['hr.salary.rule.category'].browse({id for ids in category_parents.values() for id in ids})
+        }
+        # lines of the payslips, with the total of their category
+        self.env.cr.execute("""
+            SELECT pl.slip_id, pl.category_id, pl.name, pl.code, pl.total,
+                SUM(pl.total) OVER (PARTITION BY pl.slip_id, pl.category_id)
+            FROM hr_payslip_line as pl
+            LEFT JOIN hr_salary_rule_category AS rc on (pl.category_id = rc.id)
+            WHERE pl.slip_id IN %s AND pl.appears_on_payslip AND pl.category_id IS NOT NULL
+            ORDER BY pl.sequence, rc.parent_id, pl.id""",
+            (tuple(payslips.ids),))
         result = {}
-
-        if payslip_lines:
-            self.env.cr.execute("""
-                SELECT pl.id, pl.category_id, pl.slip_id FROM hr_payslip_line as pl
-                LEFT JOIN hr_salary_rule_category AS rc on (pl.category_id = rc.id)
-                WHERE pl.id in %s
-                GROUP BY rc.parent_id, pl.sequence, pl.id, pl.category_id
-                ORDER BY pl.sequence, rc.parent_id""",
-                (tuple(payslip_lines.ids),))
-            for x in self.env.cr.fetchall():
-                result.setdefault(x[2], {})
-                result[x[2]].setdefault(x[1], [])
-                result[x[2]][x[1]].append(x[0])
-            for payslip_id, lines_dict in result.items():
-                res.setdefault(payslip_id, [])
-                for rule_categ_id, line_ids in lines_dict.items():
-                    rule_categories = RuleCateg.browse(rule_categ_id)
-                    lines = PayslipLine.browse(line_ids)
-                    level = 0
-                    for parent in get_recursive_parent(rule_categories):
-                        res[payslip_id].append({
-                            'rule_category': parent.name,
-                            'name': parent.name,
-                            'code': parent.code,
-                            'level': level,
-                            'total': sum(lines.mapped('total')),
-                        })
-                        level += 1
-                    for line in lines:
-                        res[payslip_id].append({
-                            'rule_category': line.name,
-                            'name': line.name,
-                            'code': line.code,
-                            'total': line.total,
-                            'level': level
-                        })
-        return res
-
-    def get_lines_by_contribution_register(self, payslip_lines):
-        result = {}
-        res = {}
-        for line in payslip_lines.filtered('register_id'):
-            result.setdefault(line.slip_id.id, {})
-            result[line.slip_id.id].setdefault(line.register_id, line)
-            result[line.slip_id.id][line.register_id] |= line
+        for slip_id, category_id, name, code, total, category_total in self.env.cr.fetchall():
+            result.setdefault(slip_id, {})
+            result[slip_id].setdefault(category_id, (category_total, []))
+            result[slip_id][category_id][1].append((name, code, total))
         for payslip_id, lines_dict in result.items():
             res.setdefault(payslip_id, [])
-            for register, lines in lines_dict.items():
-                res[payslip_id].append({
-                    'register_name': register.name,
-                    'total': sum(lines.mapped('total')),
-                })
-                for line in lines:
+            for rule_categ_id, (category_total, lines) in lines_dict.items():
+                level = 0
+                for parent_id in category_parents[rule_categ_id]:
+                    parent = categories[parent_id]
+                    res[payslip_id].append({
+                        'rule_category': parent.name,
+                        'name': parent.name,
+                        'code': parent.code,
+                        'level': level,
+                        'total': category_total,
+                    })
+                    level += 1
+                for name, code, total in lines:
                     res[payslip_id].append({
-                        'name': line.name,
-                        'code': line.code,
-                        'quantity': line.quantity,
-                        'amount': line.amount,
-                        'total': line.total,
+                        'rule_category': name,
+                        'name': name,
+                        'code': code,
+                        'total': total,
+                        'level': level
                     })
         return res
 
@@ -94,6 +79,5 @@ class PayslipDetailsReport(models.AbstractModel):
             'doc_model': 'hr.payslip',
             'docs': payslips,
             'data': data,
-            'get_details_by_rule_category': self.get_details_by_rule_category(payslips.mapped('details_by_salary_rule_category').filtered(lambda r: r.appears_on_payslip)),
-            'get_lines_by_contribution_register': self.get_lines_by_contribution_register(payslips.mapped('line_ids').filtered(lambda r: r.appears_on_payslip)),
+            'get_details_by_rule_category': self.get_details_by_rule_category(payslips),
         }
@@ -2,3 +2,16 @@
 # Part of BrowseInfo. See LICENSE file for full copyright and licensing details.
 
 from . import test_payslip_flow
+from . import test_payslip_run_queue
+from . import test_payslip_run_generate
+from . import test_tax_bracket
+from . import test_rule_engine_parity
+from . import test_rule_sandbox
+from . import test_rule_graph
+from . import test_payroll_summary
+from . import test_payroll_ytd
+from . import test_payslip_compute
+from . import test_rule_code_cache
+from . import test_payslip_history
+from . import test_worked_days
+from . import test_payslip_reports
@@ -40,7 +40,7 @@ class TestPayslipBase(TransactionCase):
         })
 
         # I create a contract for "Richard"
-        self.env['hr.contract'].create({
+        self.richard_contract = self.env['hr.contract'].create({
             'date_end': Date.to_string((datetime.now() + timedelta(days=365))),
             'date_start': Date.today(),
             'name': 'Contract for Richard',
@@ -49,3 +49,32 @@ class TestPayslipBase(TransactionCase):
             'employee_id': self.richard_emp.id,
             'struct_id': self.developer_pay_structure.id,
         })
+
+    def _create_payslip(self, date_from='2011-09-01', date_to='2011-09-30', input_amount=None, compute=False,
+                        done=False, **values):
+        """
+        Create a payslip of Richard on his contract, filled as by onchange_employee_id
+        @param input_amount: the amount of all the inputs of the payslip
+        @param compute: compute the payslip
+        @param done: confirm the payslip
+        """
+        onchange_values = self.env['hr.payslip'].with_context(contract=True).onchange_employee_id(
+            date_from, date_to, self.richard_emp.id, self.richard_contract.id)['value']
+        inputs = onchange_values['input_line_ids']
+        if input_amount is not None:
+            inputs = [dict(line, amount=input_amount) for line in inputs]
+        payslip_values = dict(
+            onchange_values,
+            employee_id=self.richard_emp.id,
+            date_from=date_from,
+            date_to=date_to,
+            worked_days_line_ids=[(0, 0, line) for line in onchange_values['worked_days_line_ids']],
+            input_line_ids=[(0, 0, line) for line in inputs],
+        )
+        payslip_values.update(values)
+        payslip = self.env['hr.payslip'].create(payslip_values)
+        if compute:
+            payslip.compute_sheet()
+        if done:
+            payslip.action_payslip_done()
+        return payslip
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+# Part of BrowseInfo. See LICENSE file for full copyright and licensing details.
+
+from bi_hr_payroll.tests.common import TestPayslipBase
+
+
+class TestPayrollSummary(TestPayslipBase):
+
+    def setUp(self):
+        super(TestPayrollSummary, self).setUp()
+        self.payslip = self._create_payslip(input_amount=1500.0, compute=True)
+
+    def _get_summary(self):
+        summary = self.env['hr.payroll.summary'].search([('employee_id', '=', self.richard_emp.id)])
+        return sorted((row.code, row.line_count, round(row.total, 2)) for row in summary)
+
+    def _get_expected_summary(self):
+        # the summary computed from the lines of the done payslips, credit notes counting negatively
+        totals = {}
+        payslips = self.env['hr.payslip'].search([('employee_id', '=', self.richard_emp.id), ('state', '=', 'done')])
+        for line in payslips.mapped('line_ids'):
+            count, total = totals.get(line.code, (0, 0.0))
+            sign = -1 if line.slip_id.credit_note else 1
+            totals[line.code] = (count + 1, total + sign * line.total)
+        return sorted((code, count, round(total, 2)) for code, (count, total) in totals.items())
+
+    def test_00_summary_maintained(self):
+        # I confirm the payslip, the summary holds its lines
+        self.payslip.action_payslip_done()
+        self.assertTrue(self._get_summary())
+        self.assertEqual(self._get_summary(), self._get_expected_summary())
+
+        # I refund the payslip, the refund cancels the totals
+        self.payslip.refund_sheet()
+        self.assertEqual(self._get_summary(), self._get_expected_summary())
+        self.assertFalse([total for code, count, total in self._get_summary() if total])
+
+        # I set the refund back to draft, then rebuild the summary as done on install
+        refund = self.env['hr.payslip'].search([('credit_note', '=', True), ('employee_id', '=', self.richard_emp.id)])
+        refund.action_payslip_draft()
+        self.assertEqual(self._get_summary(), self._get_expected_summary())
+        self.env['hr.payroll.summary']._rebuild()
+        self.assertEqual(self._get_summary(), self._get_expected_summary())
+        self.env.cr.execute("DELETE FROM hr_payroll_summary")
+        self.env['hr.payroll.summary'].init()
+        self.assertEqual(self._get_summary(), self._get_expected_summary())
+
+    def test_01_contribution_register_refund(self):
+        # I confirm and refund the payslip
+        self.payslip.action_payslip_done()
+        self.payslip.refund_sheet()
+
+        # I check the total of each register is the total of its printed lines
+        registers = self.payslip.line_ids.mapped('register_id')
+        self.assertTrue(registers)
+        report = self.env['report.bi_hr_payroll.report_contributionregister'].with_context(active_ids=registers.ids)
+        values = report._get_report_values(registers.ids, data={'form': {'date_from': '2011-09-01', 'date_to': '2011-09-30'}})
+        for register in registers:
+            lines = list(values['lines_data'][register.id])
+            self.assertEqual(len(lines), 2 * len(self.payslip.line_ids.filtered(lambda line: line.register_id == register)))
+            self.assertAlmostEqual(values['lines_total'][register.id], sum(line['total'] for line in lines))
+            self.assertAlmostEqual(values['lines_total'][register.id], 0.0)
+
+    def test_02_register_changed_between_payslips(self):
+        # I confirm the payslip, then a second one of the period whose commission moves to a new register
+        self.payslip.action_payslip_done()
+        register = self.env['hr.contribution.register'].create({'name': 'Sales Commissions'})
+        payslip = self._create_payslip(input_amount=1500.0, compute=True)
+        payslip.line_ids.filtered(lambda line: line.code == 'HRA').register_id = register
+        payslip.action_payslip_done()
+
+        # I check each register keeps the totals of its own lines
+        summary = self.env['hr.payroll.summary'].search([('employee_id', '=', self.richard_emp.id), ('code', '=', 'HRA')])
+        self.assertEqual(len(summary), 2, 'The lines of another register should not share a summary row')
+        hra = self.payslip.line_ids.filtered(lambda line: line.code == 'HRA')
+        self.assertEqual(summary.filtered(lambda row: row.register_id == register).total, hra.total)
+        self.assertEqual(summary.filtered(lambda row: row.register_id == hra.register_id).total, hra.total)
+
+        # I set the second payslip back to draft, the first one keeps its register
+        payslip.action_payslip_draft()
+        self.assertEqual(self._get_summary(), self._get_expected_summary())
+        summary = self.env['hr.payroll.summary'].search([('employee_id', '=', self.richard_emp.id), ('code', '=', 'HRA')])
+        self.assertEqual(summary.register_id, hra.register_id)
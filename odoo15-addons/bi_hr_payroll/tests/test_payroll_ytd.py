@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+# Part of BrowseInfo. See LICENSE file for full copyright and licensing details.
+
+from bi_hr_payroll.tests.common import TestPayslipBase
+
+
+class TestPayrollYtd(TestPayslipBase):
+
+    def setUp(self):
+        super(TestPayrollYtd, self).setUp()
+        self.payslips = self._create_payslip('2011-08-01', '2011-08-31', input_amount=1500.0, compute=True) | \
+            self._create_payslip('2011-09-01', '2011-09-30', input_amount=1500.0, compute=True)
+
+    def _get_ledger(self):
+        ledger = self.env['hr.payroll.ytd']._get_ledger(self.richard_emp.ids, [2011])[(self.richard_emp.id, 2011)]
+        return self._round_ledger(ledger)
+
+    def _round_ledger(self, ledger):
+        return {kind: {code: (round(total, 2), count) for code, (total, count) in rows.items() if count or round(total, 2)}
+                for kind, rows in ledger.items()}
+
+    def _get_expected_ledger(self):
+        # the ledger computed from the lines of the done payslips, credit notes counting negatively
+        ledger = {'rule': {}, 'category': {}}
+        payslips = self.env['hr.payslip'].search([('employee_id', '=', self.richard_emp.id), ('state', '=', 'done')])
+        for payslip in payslips:
+            sign = -1 if payslip.credit_note else 1
+            codes = {'rule': set(), 'category': set()}
+            for line in payslip.line_ids:
+                codes['rule'].add(line.code)
+                category = line.category_id
+                while category:
+                    codes['category'].add(category.code)
+                    total, count = ledger['category'].get(category.code, (0.0, 0))
+                    ledger['category'][category.code] = (total + sign * line.total, count)
+                    category = category.parent_id
+                total, count = ledger['rule'].get(line.code, (0.0, 0))
+                ledger['rule'][line.code] = (total + sign * line.total, count)
+            for kind, kind_codes in codes.items():
+                for code in kind_codes:
+                    total, count = ledger[kind][code]
+                    ledger[kind][code] = (total, count + sign)
+        return self._round_ledger(ledger)
+
+    def test_00_ytd_maintained(self):
+        # I put the allowances under the gross category, the ledger counts them for both
+        self.env.ref('bi_hr_payroll.ALW').parent_id = self.env.ref('bi_hr_payroll.GROSS')
+
+        # I confirm the payslips, the ledger holds their totals
+        self.payslips.action_payslip_done()
+        self.assertEqual(self._get_ledger()['rule']['NET'][1], 2)
+        self.assertEqual(self._get_ledger(), self._get_expected_ledger())
+
+        # I refund the last payslip, then set the first one back to draft
+        self.payslips[1].refund_sheet()
+        self.assertEqual(self._get_ledger(), self._get_expected_ledger())
+        self.payslips[0].action_payslip_draft()
+        self.assertEqual(self._get_ledger(), self._get_expected_ledger())
+
+        # I rebuild the ledger, and build it again as done on install
+        self.env['hr.payroll.ytd']._rebuild()
+        self.assertEqual(self._get_ledger(), self._get_expected_ledger())
+        self.env.cr.execute("DELETE FROM hr_payroll_ytd")
+        self.env['hr.payroll.ytd'].init()
+        self.assertEqual(self._get_ledger(), self._get_expected_ledger())
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+# Part of BrowseInfo. See LICENSE file for full copyright and licensing details.
+
+from bi_hr_payroll.tests.common import TestPayslipBase
+
+
+class TestPayslipCompute(TestPayslipBase):
+
+    def setUp(self):
+        super(TestPayslipCompute, self).setUp()
+        self.payslip = self._create_payslip(input_amount=1500.0)
+
+    def _get_lines(self):
+        self.payslip.invalidate_cache()
+        return sorted((line.code, line.amount, line.quantity, line.rate, line.total) for line in self.payslip.line_ids)
+
+    def _tamper(self):
+        # alter the stored lines behind the ORM, which keeps the fingerprint of the payslip
+        self.payslip.line_ids.flush()
+        self.env.cr.execute("UPDATE hr_payslip_line SET amount = -1 WHERE slip_id = %s", [self.payslip.id])
+        self.payslip.invalidate_cache()
+
+    def _assert_recomputed(self, message):
+        lines = self._get_lines()
+        self.payslip.with_context(force_compute_sheet=True).compute_sheet()
+        self.assertEqual(lines, self._get_lines(), message)
+
+    def test_00_unchanged_payslips_skipped(self):
+        # I compute the payslip, then compute it again without any change: it is skipped
+        self.payslip.compute_sheet()
+        self._tamper()
+        self.payslip.compute_sheet()
+        self.assertEqual(set(self.payslip.line_ids.mapped('amount')), {-1}, 'The unchanged payslip should be skipped')
+
+        # I change an input, the payslip is computed again
+        self.payslip.input_line_ids[:1].amount = 2500.0
+        self.payslip.compute_sheet()
+        self._assert_recomputed('The payslip should be computed again after an input change')
+
+        # I change the wage of the contract, the payslip is computed again
+        self._tamper()
+        self.payslip.contract_id.wage = 6000.0
+        self.payslip.compute_sheet()
+        self._assert_recomputed('The payslip should be computed again after a contract change')
+
+        # I set back to draft a done payslip which is not the last one, the payslip is computed again
+        done_payslips = self._create_payslip('2011-07-01', '2011-07-31', input_amount=1500.0, done=True) | \
+            self._create_payslip('2011-08-01', '2011-08-31', input_amount=1500.0, done=True)
+        self.payslip.compute_sheet()
+        self._tamper()
+        done_payslips[0].action_payslip_draft()
+        self.payslip.compute_sheet()
+        self._assert_recomputed('The payslip should be computed again after a change of the done payslips')
+
+    def test_01_lines_updated_in_place(self):
+        # I compute the payslip, then change the sales to Europe and compute it again
+        self.payslip.compute_sheet()
+        line_ids = {line.code: line.id for line in self.payslip.line_ids}
+        self.payslip.input_line_ids[:1].amount = 2500.0
+        self.payslip.compute_sheet()
+
+        # I check the lines were updated in place, to the values of a computation from scratch
+        self.assertEqual({line.code: line.id for line in self.payslip.line_ids}, line_ids,
+                         'The lines should keep their ids')
+        lines = self._get_lines()
+        self.payslip.line_ids.unlink()
+        self.payslip.compute_sheet()
+        self.assertEqual(lines, self._get_lines(), 'The updated lines should be the computed ones')
+
+        # I remove the commission on sales from the structure, its line is deleted
+        line_ids = {line.code: line.id for line in self.payslip.line_ids}
+        self.developer_pay_structure.rule_ids = [(3, self.comm_rule_id)]
+        self.payslip.compute_sheet()
+        del line_ids['SALE']
+        self.assertEqual({line.code: line.id for line in self.payslip.line_ids}, line_ids,
+                         'Only the line of the removed rule should be deleted')
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+# Part of BrowseInfo. See LICENSE file for full copyright and licensing details.
+
+from bi_hr_payroll.tests.common import TestPayslipBase
+from odoo import fields
+from odoo.addons.bi_hr_payroll.models.hr_payslip import InputLine, Payslips, WorkedDays
+
+
+class TestPayslipHistory(TestPayslipBase):
+
+    def test_00_history_sums(self):
+        # I confirm two payslips of Richard and refund the first one
+        done_payslips = self._create_payslip('2011-07-01', '2011-07-31', input_amount=1000.0, done=True) | \
+            self._create_payslip('2011-08-01', '2011-08-31', input_amount=2500.0, done=True)
+        done_payslips[0].refund_sheet()
+        payslip = self._create_payslip(input_amount=0.0)
+        history = payslip._get_history()
+
+        # I check the sums of the rules give the results of the queries by code, with and without the history
+        employee_id = self.richard_emp.id
+        for from_date, to_date in [('2011-01-01', '2011-12-31'), ('2011-08-01', '2011-08-31'), ('2009-01-01', None)]:
+            for code in ('SALEURO', 'UNKNOWN'):
+                self.assertEqual(InputLine(employee_id, {}, self.env, history).sum(code, from_date, to_date),
+                                 InputLine(employee_id, {}, self.env).sum(code, from_date, to_date))
+            for code in ('WORK100', 'UNKNOWN'):
+                worked_days = WorkedDays(employee_id, {}, self.env, history)
+                baseline = WorkedDays(employee_id, {}, self.env)
+                self.assertEqual(worked_days.sum(code, from_date, to_date), baseline.sum(code, from_date, to_date))
+                self.assertEqual(worked_days.sum_hours(code, from_date, to_date), baseline.sum_hours(code, from_date, to_date))
+            for code in ('NET', 'HRA', 'UNKNOWN'):
+                self.env.cr.execute("""
+                    SELECT sum(case when hp.credit_note = False then (pl.total) else (-pl.total) end)
+                    FROM hr_payslip as hp, hr_payslip_line as pl
+                    WHERE hp.employee_id = %s AND hp.state = 'done'
+                    AND hp.date_from >= %s AND hp.date_to <= %s AND hp.id = pl.slip_id AND pl.code = %s""",
+                    (employee_id, from_date, to_date or payslip.date_to.today(), code))
+                expected = self.env.cr.fetchone()[0] or 0.0
+                self.assertAlmostEqual(Payslips(employee_id, payslip, self.env, history).sum(code, from_date, to_date), expected)
+                self.assertAlmostEqual(Payslips(employee_id, payslip, self.env).sum(code, from_date, to_date), expected)
+        self.assertAlmostEqual(Payslips(employee_id, payslip, self.env, history).sum('HRA', '2011-01-01', '2011-12-31'),
+                               2000.0, 'The refunded payslip should not count')
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+# Part of BrowseInfo. See LICENSE file for full copyright and licensing details.
+
+from bi_hr_payroll.tests.common import TestPayslipBase
+
+
+class TestPayslipDetailsReport(TestPayslipBase):
+
+    def _get_details_by_rule_category(self, payslip):
+        # the details of the payslip as computed line by line before the report used SQL
+        lines_by_category = {}
+        lines = payslip.details_by_salary_rule_category.filtered(lambda line: line.appears_on_payslip)
+        for line in lines.sorted(lambda line: (line.sequence, line.category_id.parent_id.id or 0, line.id)):
+            lines_by_category.setdefault(line.category_id, self.env['hr.payslip.line'])
+            lines_by_category[line.category_id] |= line
+        res = []
+        for category, lines in lines_by_category.items():
+            parents = []
+            while category:
+                parents.insert(0, category)
+                category = category.parent_id
+            for level, parent in enumerate(parents):
+                res.append((parent.code, parent.name, level, round(sum(lines.mapped('total')), 2)))
+            for line in lines:
+                res.append((line.code, line.name, len(parents), round(line.total, 2)))
+        return sorted(res)
+
+    def test_00_details_by_rule_category(self):
+        # I put the allowances under a new category, itself under the gross
+        categories = self.env['hr.salary.rule.category']
+        variable = categories.create({'name': 'Variable', 'code': 'VAR', 'parent_id': self.ref('bi_hr_payroll.GROSS')})
+        categories.browse(self.ref('bi_hr_payroll.ALW')).parent_id = variable
+
+        # I compute two payslips of Richard, then print their details
+        payslips = self._create_payslip(input_amount=1500.0, compute=True)
+        payslips |= self._create_payslip(date_from='2011-10-01', date_to='2011-10-31', input_amount=500.0, compute=True)
+        report = self.env['report.bi_hr_payroll.report_payslipdetails']
+        values = report._get_report_values(payslips.ids)
+
+        # I check the details give the totals of each category and line, with the parents of the
+        # categories, as computed line by line
+        for payslip in payslips:
+            details = values['get_details_by_rule_category'][payslip.id]
+            self.assertEqual(
+                sorted((line['code'], line['name'], line['level'], round(line['total'], 2)) for line in details),
+                self._get_details_by_rule_category(payslip))
+        self.assertIn('VAR', [line['code'] for line in values['get_details_by_rule_category'][payslips[0].id]])
+
+
+class TestContributionRegisterReport(TestPayslipBase):
+
+    def setUp(self):
+        super(TestContributionRegisterReport, self).setUp()
+        # I confirm a payslip of Richard, and refund another one of the period
+        self.payslip = self._create_payslip(input_amount=1500.0, compute=True, done=True)
+        refunded = self._create_payslip(input_amount=500.0, compute=True, done=True)
+        refunded.refund_sheet()
+        self.payslips = self.payslip | refunded
+        self.registers = self.payslip.line_ids.mapped('register_id')
+        self.assertTrue(self.registers)
+        self.data = {'form': {'date_from': '2011-09-01', 'date_to': '2011-09-30'}}
+
+    def _get_register_lines(self, register):
+        # the signed lines of the done payslips on the register
+        lines = self.env['hr.payslip.line'].search([
+            ('slip_id.state', '=', 'done'), ('slip_id.employee_id', '=', self.richard_emp.id), ('register_id', '=', register.id),
+        ])
+        return sorted((line.code, round(-line.total if line.slip_id.credit_note else line.total, 2)) for line in lines)
+
+    def _render(self, data):
+        report = self.env.ref('bi_hr_payroll.action_contribution_register').with_context(active_ids=self.registers.ids)
+        html = report._render_qweb_html(self.registers.ids, data=data)[0]
+        return html.decode() if isinstance(html, bytes) else html
+
+    def test_00_register_lines_and_totals(self):
+        report = self.env['report.bi_hr_payroll.report_contributionregister'].with_context(active_ids=self.registers.ids)
+        values = report._get_report_values(self.registers.ids, data=self.data)
+        for register in self.registers:
+            # I check the streamed lines are the signed lines of the register, whatever the page size
+            expected = self._get_register_lines(register)
+            lines = list(values['lines_data'][register.id])
+            self.assertEqual(sorted((line['code'], round(line['total'], 2)) for line in lines), expected)
+            pages = values['lines_data'][register.id]
+            pages.page_size = 1
+            self.assertEqual(list(pages), lines, 'The lines should not depend on the size of the fetched pages')
+
+            # I check the totals of the summary are the ones of the lines
+            self.assertEqual(values['lines_count'][register.id], len(expected))
+            self.assertAlmostEqual(values['lines_total'][register.id], sum(total for code, total in expected))
+
+        # I check the totals only mode gives the totals without the lines
+        totals = report._get_report_values(self.registers.ids, data={'form': dict(self.data['form'], totals_only=True)})
+        self.assertFalse(totals['lines_data'])
+        self.assertEqual(totals['lines_total'], values['lines_total'])
+        self.assertEqual(totals['lines_count'], values['lines_count'])
+
+    def test_01_render_register(self):
+        # I print the registers with their lines, then their totals only
+        html = self._render(self.data)
+        html_totals = self._render({'form': dict(self.data['form'], totals_only=True)})
+        for register in self.registers:
+            self.assertIn(register.name, html)
+            self.assertIn(register.name, html_totals)
+        self.assertIn(self.payslip.name, html, 'The lines should be printed')
+        self.assertNotIn(self.payslip.name, html_totals, 'The lines should not be printed')
+        self.assertIn('PaySlip Name', html)
+        self.assertNotIn('PaySlip Name', html_totals)
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+# Part of BrowseInfo. See LICENSE file for full copyright and licensing details.
+
+from bi_hr_payroll.tests.common import TestPayslipBase
+
+
+class TestPayslipRunGenerate(TestPayslipBase):
+
+    def setUp(self):
+        super(TestPayslipRunGenerate, self).setUp()
+        self.payslip_run = self.env['hr.payslip.run'].create({
+            'date_end': '2011-09-30',
+            'date_start': '2011-09-01',
+            'name': 'Payslip Batch Generated at Once',
+        })
+
+    def _create_employees(self, count, name):
+        # employees on running contracts of the developer structure, every other one on a second
+        # contract without structure, and a last one without any contract
+        employees = self.env['hr.employee'].create([{'name': '%s %s' % (name, index)} for index in range(count + 1)])
+        contract_vals = []
+        for index, employee in enumerate(employees[:-1]):
+            contract_vals.append({
+                'date_start': '2011-01-01',
+                'name': 'Contract of %s' % employee.name,
+                'wage': 1000.0 * (index + 1),
+                'employee_id': employee.id,
+                'struct_id': self.developer_pay_structure.id,
+                'state': 'open',
+            })
+            if index % 2:
+                contract_vals.append({
+                    'date_start': '2011-09-15',
+                    'name': 'Second Contract of %s' % employee.name,
+                    'wage': 500.0,
+                    'employee_id': employee.id,
+                    'state': 'open',
+                })
+        self.env['hr.contract'].create(contract_vals)
+        return employees
+
+    def test_00_generated_as_onchange(self):
+        employees = self._create_employees(4, 'Batch Employee')
+        payslips = self.payslip_run._generate_payslips_chunk(employees)
+        self.assertEqual(payslips.mapped('employee_id'), employees)
+
+        # I check each payslip is filled as by onchange_employee_id, as the batches used to be
+        Payslip = self.env['hr.payslip']
+        for payslip in payslips:
+            values = Payslip.onchange_employee_id(
+                payslip.date_from, payslip.date_to, payslip.employee_id.id, contract_id=False)['value']
+            self.assertEqual(payslip.name, values['name'])
+            self.assertEqual(payslip.contract_id.id, values['contract_id'])
+            self.assertEqual(payslip.struct_id.id, values['struct_id'])
+            self.assertEqual(payslip.company_id.id, values['company_id'])
+            self.assertEqual(payslip.payslip_run_id, self.payslip_run)
+            worked_days_lines = values['worked_days_line_ids'] if values['struct_id'] else []
+            self.assertEqual(
+                sorted((line.code, line.contract_id.id, line.number_of_days, line.number_of_hours)
+                       for line in payslip.worked_days_line_ids),
+                sorted((line['code'], line['contract_id'], line['number_of_days'], line['number_of_hours'])
+                       for line in worked_days_lines))
+            input_lines = values['input_line_ids'] if values['struct_id'] else []
+            self.assertEqual(
+                sorted((line.code, line.name, line.contract_id.id) for line in payslip.input_line_ids),
+                sorted((line['code'], line['name'], line['contract_id']) for line in input_lines))
+            if payslip.struct_id:
+                self.assertTrue(payslip.line_ids, 'The generated payslip should be computed')
+
+    def test_01_generation_query_count(self):
+        # I generate the payslip of a single employee, for reference
+        employee = self._create_employees(1, 'Single Employee')[:1]
+        self.env['base'].flush()
+        self.env['base'].invalidate_cache()
+        query_count = self.cr.sql_log_count
+        self.payslip_run._generate_payslips_chunk(employee)
+        self.env['base'].flush()
+        query_count = self.cr.sql_log_count - query_count
+
+        # I check the payslips of more employees take the same queries, but the numbers of the
+        # payslips, drawn one by one
+        employees = self._create_employees(6, 'Batch Employee')
+        self.env['base'].flush()
+        self.env['base'].invalidate_cache()
+        with self.assertQueryCount(query_count + 3 * (len(employees) - 1)):
+            self.payslip_run._generate_payslips_chunk(employees)
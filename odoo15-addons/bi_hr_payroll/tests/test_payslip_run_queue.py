@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+# Part of BrowseInfo. See LICENSE file for full copyright and licensing details.
+
+from bi_hr_payroll.tests.common import TestPayslipBase
+
+
+class TestPayslipRunQueue(TestPayslipBase):
+
+    def setUp(self):
+        super(TestPayslipRunQueue, self).setUp()
+        # the batches look for the running contracts of the employees over their period
+        self.env['hr.contract'].search([('employee_id', '=', self.richard_emp.id)]).write({
+            'date_start': '2011-01-01',
+            'state': 'open',
+        })
+
+    def test_00_payslip_run_queue(self):
+        # I create a Payslip run and queue the payslips of Richard
+        payslip_run = self.env['hr.payslip.run'].create({
+            'date_end': '2011-09-30',
+            'date_start': '2011-09-01',
+            'name': 'Queued Payslip for Employee'
+        })
+        payslip_employee = self.env['hr.payslip.employees'].create({
+            'employee_ids': [(4, self.richard_emp.id)],
+            'run_in_background': True,
+        })
+        payslip_employee.with_context(active_id=payslip_run.id).compute_sheet()
+
+        # Nothing is computed until the scheduled action runs
+        self.assertEqual(payslip_run.chunk_pending_count, 1, 'The chunk should be queued')
+        self.assertFalse(payslip_run.slip_ids, 'No payslip should be generated yet')
+
+        # I run the scheduled action, which computes the queued chunk
+        self.env['hr.payslip.run.chunk']._cron_run_pending()
+        payslip_run.invalidate_cache()
+        self.assertEqual(payslip_run.chunk_ids.state, 'done', 'The chunk should be computed')
+        self.assertEqual(payslip_run.chunk_done_count, 1)
+        self.assertEqual(payslip_run.chunk_pending_count, 0)
+        self.assertEqual(payslip_run.chunk_progress, 100.0)
+        self.assertEqual(payslip_run.slip_ids.employee_id, self.richard_emp)
+        self.assertTrue(payslip_run.slip_ids.line_ids, 'The queued payslip should be computed')
+
+        # The user who queued the batch is notified once, whatever the scheduled actions run after
+        self.env['hr.payslip.run']._notify_chunks_done()
+        self.env['hr.payslip.run.chunk']._cron_run_pending()
+        self.assertFalse(payslip_run.chunk_notify_user_id)
+        self.assertEqual(self.env['bus.bus'].search_count([('message', 'like', payslip_run.name)]), 1,
+                         'The batch should be notified once')
+
+    def test_01_chunks_computed_once(self):
+        payslip_run = self.env['hr.payslip.run'].create({
+            'date_end': '2011-09-30',
+            'date_start': '2011-09-01',
+            'name': 'Payslip Batch Computed Once'
+        })
+        chunk = payslip_run._create_chunks([self.richard_emp])
+
+        # I compute the chunk, then run it again and run the scheduled action: the computed chunk is skipped
+        chunk._run()
+        self.assertEqual(chunk.state, 'done')
+        chunk._run()
+        self.env['hr.payslip.run.chunk']._cron_run_pending()
+        self.assertEqual(len(payslip_run.slip_ids), 1, 'The chunk should be computed once')
+
+    def test_02_chunks_with_workers(self):
+        # I configure a worker, then generate the payslips of Richard without running in background
+        self.env['ir.config_parameter'].sudo().set_param('bi_hr_payroll.payslip_run_workers', '1')
+        payslip_run = self.env['hr.payslip.run'].create({
+            'date_end': '2011-09-30',
+            'date_start': '2011-09-01',
+            'name': 'Payslip Batch Computed by a Worker'
+        })
+        payslip_employee = self.env['hr.payslip.employees'].create({
+            'employee_ids': [(4, self.richard_emp.id)],
+            'run_in_background': False,
+        })
+        payslip_employee.with_context(active_id=payslip_run.id).compute_sheet()
+
+        # The chunks are left to the scheduled action, not computed in the request
+        self.assertEqual(payslip_run.chunk_pending_count, 1, 'The chunk should be queued')
+        self.assertFalse(payslip_run.slip_ids, 'No payslip should be generated in the request')
+
+        # I make the chunk fail, it is flagged and the next chunks are computed
+        meal_voucher = self.env['hr.salary.rule'].browse(self.mv_rule_id)
+        quantity = meal_voucher.quantity
+        meal_voucher.quantity = 'worked_days.UNKNOWN.number_of_days'
+        self.env['hr.payslip.run.chunk']._cron_run_pending()
+        payslip_run.invalidate_cache()
+        self.assertEqual(payslip_run.chunk_ids.state, 'failed')
+        self.assertTrue(payslip_run.chunk_ids.error)
+        self.assertFalse(payslip_run.slip_ids, 'The payslips of the failed chunk should be rolled back')
+
+        # I fix the rule and retry the chunk, which is queued again then computed
+        meal_voucher.quantity = quantity
+        payslip_run.chunk_ids.action_retry()
+        self.assertEqual(payslip_run.chunk_ids.state, 'pending')
+        self.env['hr.payslip.run.chunk']._cron_run_pending()
+        payslip_run.invalidate_cache()
+        self.assertEqual(payslip_run.chunk_ids.state, 'done')
+        self.assertEqual(payslip_run.slip_ids.employee_id, self.richard_emp)
+        self.assertTrue(payslip_run.slip_ids.line_ids, 'The retried payslip should be computed')
+
+    def test_03_chunks_of_filtered_employees(self):
+        # I create employees in a new department, and make chunks of a single employee
+        department = self.env['hr.department'].create({'name': 'Payroll Chunks'})
+        employees = self.env['hr.employee'].create([
+            {'name': 'Filtered Employee %s' % index, 'department_id': department.id} for index in range(2)
+        ])
+        self.env['hr.contract'].create([{
+            'date_start': '2011-01-01',
+            'name': 'Contract of %s' % employee.name,
+            'wage': 2000.0,
+            'employee_id': employee.id,
+            'struct_id': self.developer_pay_structure.id,
+            'state': 'open',
+        } for employee in employees])
+        self.env['ir.config_parameter'].sudo().set_param('bi_hr_payroll.payslip_run_chunk_size', '1')
+
+        # I queue the payslips of the employees of the department
+        payslip_run = self.env['hr.payslip.run'].create({
+            'date_end': '2011-09-30',
+            'date_start': '2011-09-01',
+            'name': 'Payslip Batch of a Department'
+        })
+        payslip_employee = self.env['hr.payslip.employees'].create({
+            'selection_mode': 'domain',
+            'department_ids': [(4, department.id)],
+            'run_in_background': True,
+        })
+        payslip_employee.with_context(active_id=payslip_run.id).compute_sheet()
+
+        # The chunks keep the filters and the bounds of their employees, not the employees
+        chunks = payslip_run.chunk_ids
+        self.assertEqual(len(chunks), 2)
+        self.assertFalse(chunks.mapped('employee_ids'))
+        self.assertEqual(chunks.mapped('employee_count'), [1, 1])
+        self.assertEqual(chunks[0]._get_employees() | chunks[1]._get_employees(), employees)
+
+        # I run the scheduled action, each chunk generates the payslip of its employee
+        self.env['hr.payslip.run.chunk']._cron_run_pending()
+        self.assertEqual(chunks.mapped('state'), ['done', 'done'])
+        self.assertEqual(chunks.mapped('payslip_count'), [1, 1])
+        self.assertEqual(payslip_run.slip_ids.employee_id, employees)
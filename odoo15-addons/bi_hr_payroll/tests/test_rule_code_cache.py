@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+# Part of BrowseInfo. See LICENSE file for full copyright and licensing details.
+
+from bi_hr_payroll.tests.common import TestPayslipBase
+
+
+class TestRuleCodeCache(TestPayslipBase):
+
+    def test_00_compiled_code_cache(self):
+        payslip = self._create_payslip()
+        contract_ids = payslip.contract_id.ids
+        rules = self.env['hr.salary.rule']
+
+        # I compute the payslip twice, the second time from the compiled code cache only
+        payslip._get_payslip_lines(contract_ids, payslip.id, engine='python')
+        stats = rules._get_code_cache_stats()
+        payslip._get_payslip_lines(contract_ids, payslip.id, engine='python')
+        cached_stats = rules._get_code_cache_stats()
+        self.assertEqual(cached_stats['miss'], stats['miss'], 'The code should be compiled once')
+        self.assertGreater(cached_stats['hit'], stats['hit'])
+
+        # I edit the base of the house rent allowance, its code is compiled again
+        rules.browse(self.hra_rule_id).amount_percentage_base = 'contract.wage * 0.5'
+        lines = payslip._get_payslip_lines(contract_ids, payslip.id, engine='python')
+        hra_line = [line for line in lines if line['code'] == 'HRA'][0]
+        self.assertEqual(hra_line['amount'], 2500.0, 'The edited code should be evaluated')
+        self.assertGreater(rules._get_code_cache_stats()['miss'], cached_stats['miss'])
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+# Part of BrowseInfo. See LICENSE file for full copyright and licensing details.
+
+import unittest
+
+from bi_hr_payroll.tests.common import TestPayslipBase
+from odoo.exceptions import UserError
+from odoo.addons.bi_hr_payroll.models.hr_rule_engine import numpy
+
+
+@unittest.skipIf(numpy is None, "numpy is required by the vectorized rule engine")
+class TestRuleEngineParity(TestPayslipBase):
+
+    def test_00_vectorized_engine_parity(self):
+        # I create payslips of employees with different wages on the developer structure, the
+        # last one with two contracts
+        payslips = self.env['hr.payslip']
+        payslip_contracts = {}
+        for index, wages in enumerate([[5000.0], [1234.56], [98765.4], [0.0], [3000.0, 777.7]]):
+            employee = self.env['hr.employee'].create({'name': 'Parity Employee %s' % index})
+            contracts = self.env['hr.contract'].create([{
+                'date_start': '2011-01-01',
+                'name': 'Contract %s' % wage,
+                'wage': wage,
+                'employee_id': employee.id,
+                'struct_id': self.developer_pay_structure.id,
+            } for wage in wages])
+            payslip = self.env['hr.payslip'].create({
+                'employee_id': employee.id,
+                'contract_id': contracts[0].id,
+                'struct_id': self.developer_pay_structure.id,
+                'date_from': '2011-09-01',
+                'date_to': '2011-09-30',
+                'worked_days_line_ids': [(0, 0, {
+                    'name': 'Normal Working Days paid at 100%',
+                    'code': 'WORK100',
+                    'contract_id': contracts[0].id,
+                    'number_of_days': 20.0 + index,
+                    'number_of_hours': 8.0 * (20.0 + index),
+                })],
+            })
+            payslips |= payslip
+            payslip_contracts[payslip.id] = contracts.ids
+
+        # I compute the lines on the scalar and on the vectorized engine
+        scalar = {
+            payslip.id: payslips._get_payslip_lines(payslip_contracts[payslip.id], payslip.id)
+            for payslip in payslips
+        }
+        vectorized = payslips._get_payslip_lines_batch(payslip_contracts)
+
+        # I check both engines give the same lines, to the last digit
+        for payslip in payslips:
+            self.assertEqual(
+                sorted(scalar[payslip.id], key=lambda line: (line['contract_id'], line['code'])),
+                sorted(vectorized[payslip.id], key=lambda line: (line['contract_id'], line['code'])),
+                'The vectorized engine should give the lines of the scalar engine')
+        codes = {line['code'] for lines in vectorized.values() for line in lines}
+        self.assertTrue({'HRA', 'PF', 'PT', 'MA', 'NET'} <= codes)
+
+
+class TestRuleCompilerParity(TestPayslipBase):
+
+    def test_00_compiled_engine_parity(self):
+        # I create a payslip of Richard with some inputs, on the developer structure
+        payslip = self._create_payslip(input_amount=1500.0)
+        contract_ids = payslip.contract_id.ids
+
+        # I compute the lines with the interpreter and with the compiled structure
+        interpreted = payslip._get_payslip_lines(contract_ids, payslip.id, engine='python')
+        compiled = payslip._get_payslip_lines(contract_ids, payslip.id, engine='compiled')
+        self.assertTrue(self.env['hr.payroll.structure']._get_rule_program(
+            self._get_plan_structure_ids(payslip, contract_ids)), 'The structure should be compiled')
+        self.assertEqual(interpreted, compiled, 'The compiled structure should give the lines of the interpreter')
+
+        # I check a rule error names the failing rule on both engines
+        self.env['hr.salary.rule'].browse(self.mv_rule_id).quantity = 'worked_days.UNKNOWN.number_of_days'
+        for engine in ('python', 'compiled'):
+            with self.assertRaisesRegex(UserError, 'Meal Voucher'):
+                payslip._get_payslip_lines(contract_ids, payslip.id, engine=engine)
+
+    def _get_plan_structure_ids(self, payslip, contract_ids):
+        contracts = self.env['hr.contract'].browse(contract_ids)
+        return payslip._get_rule_plan(contracts, payslip.struct_id)['structure_ids']
+
+    def test_01_prefetched_record_values(self):
+        payslip = self._create_payslip()
+        payslip_contracts = {payslip.id: payslip.contract_id.ids}
+
+        # I check the fields read by the rules are found in their code and read at once
+        plan = payslip._get_rule_plan(payslip.contract_id, payslip.struct_id)
+        self.assertIn('wage', plan['record_fields']['contract'])
+        record_values = payslip._read_rule_record_values(payslip_contracts)
+        self.assertEqual(record_values['contract'][payslip.contract_id.id]['wage'], 5000.0)
+
+        # I check the rules give the same lines on the prefetched values and on the records
+        self.assertEqual(
+            payslip._get_payslip_lines(payslip.contract_id.ids, payslip.id, record_values=record_values),
+            payslip._get_payslip_lines(payslip.contract_id.ids, payslip.id),
+            'The rules should give the same lines on the prefetched values')
+
+    def test_02_shared_parent_structure(self):
+        # I create a structure under the developer structure, itself under the base structure
+        base = self.env.ref('bi_hr_payroll.structure_base')
+        child_structure = self.env['hr.payroll.structure'].create({
+            'name': 'Senior Software Developer',
+            'code': 'SSD',
+            'parent_id': self.developer_pay_structure.id,
+            'rule_ids': [(4, self.ref('bi_hr_payroll.hr_salary_rule_ca_gravie'))],
+        })
+        base_child = self.env['hr.payroll.structure'].create({
+            'name': 'Intern',
+            'code': 'INT',
+            'parent_id': base.id,
+        })
+
+        # I give Richard a contract on each structure, the base one being reached at two depths
+        self.richard_contract.struct_id = child_structure
+        contract = self.richard_contract.copy({'name': 'Second Contract for Richard', 'struct_id': base_child.id})
+        payslip = self._create_payslip(input_amount=1500.0)
+        contracts = self.richard_contract | contract
+        plan = payslip._get_rule_plan(contracts)
+        self.assertEqual(len(plan['rule_ids']), len(set(plan['rule_ids'])), 'Each rule should be planned once')
+        self.assertTrue(self.env['hr.payroll.structure']._get_rule_graph(plan['structure_ids'])['replayable'])
+
+        # I check the rules of the base structure are applied once on each contract
+        lines = payslip._get_payslip_lines(contracts.ids, payslip.id)
+        basic = [line for line in lines if line['code'] == 'BASIC']
+        self.assertEqual(sorted(line['contract_id'] for line in basic), sorted(contracts.ids))
+        for code in ('GROSS', 'NET'):
+            self.assertEqual(len([line for line in lines if line['code'] == code]), len(contracts),
+                             'The rules of the base structure should be applied once on each contract')
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+# Part of BrowseInfo. See LICENSE file for full copyright and licensing details.
+
+from bi_hr_payroll.tests.common import TestPayslipBase
+
+
+class TestRuleGraph(TestPayslipBase):
+
+    def setUp(self):
+        super(TestRuleGraph, self).setUp()
+        self.payslip = self._create_payslip(input_amount=1500.0)
+        plan = self.payslip._get_rule_plan(self.payslip.contract_id, self.payslip.struct_id)
+        self.structure_ids = plan['structure_ids']
+
+    def _get_lines(self):
+        return sorted((line.code, line.amount, line.quantity, line.rate, line.total) for line in self.payslip.line_ids)
+
+    def test_00_dirty_rules(self):
+        # I check only the commission on sales and the totals depend on the sales to Europe
+        structures = self.env['hr.payroll.structure']
+        dirty = structures._get_dirty_rules(self.structure_ids, frozenset(['SALEURO']))
+        self.assertEqual(set(self.env['hr.salary.rule'].browse(dirty).mapped('code')), {'SALE', 'GROSS', 'NET'})
+        self.assertFalse(structures._get_dirty_rules(self.structure_ids, frozenset(['UNKNOWN'])))
+
+    def test_01_partial_computation(self):
+        # I compute the payslip, then change the sales to Europe
+        self.payslip.compute_sheet()
+        self.assertTrue(self.payslip.compute_state)
+        self.payslip.input_line_ids.filtered(lambda line: line.code == 'SALEURO').amount = 4000.0
+        self.payslip.compute_sheet()
+        partial = self._get_lines()
+
+        # I check the payslip computed again on the rules depending on the input only has the
+        # lines of the whole computation
+        self.payslip.with_context(force_compute_sheet=True).compute_sheet()
+        self.assertEqual(partial, self._get_lines(), 'The partial computation should give the lines of the whole one')
+        self.assertEqual(self.payslip.line_ids.filtered(lambda line: line.code == 'SALE').amount, 55.0)
+
+    def test_02_rule_read_before_computed(self):
+        # I make the house rent allowance read the net salary, computed after it
+        self.env['hr.salary.rule'].browse(self.hra_rule_id).amount_percentage_base = 'contract.wage + NET'
+        graph = self.env['hr.payroll.structure']._get_rule_graph(self.structure_ids)
+        self.assertIn('NET', graph['references'][self.hra_rule_id]['codes'])
+        self.assertTrue(graph['warnings'].get(self.hra_rule_id), 'Reading a later code should be reported')
+        self.assertIn('NET', self.developer_pay_structure.rule_graph)
+
+    def test_03_category_ancestors(self):
+        # I put the allowances under a new category, itself under the gross
+        categories = self.env['hr.salary.rule.category']
+        allowance = categories.browse(self.ref('bi_hr_payroll.ALW'))
+        gross = categories.browse(self.ref('bi_hr_payroll.GROSS'))
+        variable = categories.create({'name': 'Variable', 'code': 'VAR', 'parent_id': gross.id})
+        allowance.parent_id = variable
+
+        # I check the plan and the closure give the parents of the allowances, root first
+        plan = self.payslip._get_rule_plan(self.payslip.contract_id, self.payslip.struct_id)
+        self.assertEqual(plan['category_codes'][allowance.id], ('GROSS', 'VAR', 'ALW'))
+        categories.flush()
+        closure = self.env['hr.salary.rule.category.ancestor'].search([('category_id', '=', allowance.id)])
+        self.assertEqual(closure.mapped('ancestor_id'), gross | variable | allowance)
+        self.assertEqual(closure.mapped('level'), [0, 1, 2])
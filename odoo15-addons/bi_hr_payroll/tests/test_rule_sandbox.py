@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+# Part of BrowseInfo. See LICENSE file for full copyright and licensing details.
+
+import logging
+import time
+
+from bi_hr_payroll.tests.common import TestPayslipBase
+from odoo.addons.bi_hr_payroll.models.hr_rule_engine import make_rule_namespace
+from odoo.addons.bi_hr_payroll.models.hr_salary_rule import RULE_CODE_FIELDS
+from odoo.exceptions import ValidationError
+from odoo.tests import tagged
+from odoo.tools.safe_eval import safe_eval
+
+_logger = logging.getLogger(__name__)
+
+
+class TestRuleSandboxBase(TestPayslipBase):
+
+    def setUp(self):
+        super(TestRuleSandboxBase, self).setUp()
+        payslip = self._create_payslip(input_amount=1500.0)
+        state = payslip._prepare_rule_state(payslip.id, payslip.contract_id.ids)
+        # the local dict once the structure is computed, all the rule codes being set
+        lines = payslip._get_payslip_lines(payslip.contract_id.ids, payslip.id)
+        self.namespace = make_rule_namespace(state['baselocaldict'], payslip.employee_id, payslip.contract_id)
+        self.namespace.update({line['code']: line['amount'] * line['quantity'] * line['rate'] / 100.0 for line in lines})
+        # the python sources of the demo and data rules
+        self.sources = []
+        for rule in state['rules']:
+            if rule.amount_select == 'code':
+                self.sources.append((rule, 'amount_python_compute'))
+            else:
+                self.sources.append((rule, 'quantity'))
+            if rule.amount_select == 'percentage':
+                self.sources.append((rule, 'amount_percentage_base'))
+
+    def _safe_eval(self, rule, fname):
+        localdict = dict(self.namespace, result=None)
+        del localdict['__builtins__']
+        value = safe_eval(rule[fname], localdict, mode=RULE_CODE_FIELDS[fname], nocopy=True)
+        return localdict['result'] if RULE_CODE_FIELDS[fname] == 'exec' else value
+
+    def _sandbox_eval(self, rule, fname):
+        self.namespace['result'] = None
+        value = rule._eval_code(fname, self.namespace)
+        return self.namespace['result'] if RULE_CODE_FIELDS[fname] == 'exec' else value
+
+
+class TestRuleSandbox(TestRuleSandboxBase):
+
+    def test_00_sandbox_parity(self):
+        # I check the sandbox gives the results of safe_eval on the demo rules
+        self.assertTrue(self.sources)
+        for rule, fname in self.sources:
+            self.assertEqual(self._sandbox_eval(rule, fname), self._safe_eval(rule, fname),
+                             'The sandbox should evaluate %s of %s like safe_eval' % (fname, rule.code))
+
+    def test_01_rule_code_checked_on_save(self):
+        rule = self.env['hr.salary.rule'].browse(self.hra_rule_id)
+        # I check the code reaching the engine names or importing modules is refused on save
+        for source in ['_ld', 'contract.__class__', '__import__("os")']:
+            with self.assertRaises(ValidationError):
+                rule.amount_percentage_base = source
+        with self.assertRaises(ValidationError):
+            rule.write({'amount_select': 'code', 'amount_python_compute': 'import os\nresult = 0'})
+        rule.amount_percentage_base = 'contract.wage * 0.5'
+
+
+@tagged('-standard', 'benchmark')
+class TestRuleSandboxBenchmark(TestRuleSandboxBase):
+
+    def test_00_rule_evaluation_cost(self):
+        # I measure the cost of the evaluation of each demo rule with safe_eval and the sandbox
+        rounds = 2000
+        for rule, fname in self.sources:
+            timings = []
+            for evaluate in (self._safe_eval, self._sandbox_eval):
+                start = time.perf_counter()
+                for i in range(rounds):
+                    evaluate(rule, fname)
+                timings.append((time.perf_counter() - start) / rounds * 1e6)
+            _logger.info("Rule %s (%s): %.2f us with safe_eval, %.2f us with the sandbox",
+                         rule.code, fname, timings[0], timings[1])
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+# Part of BrowseInfo. See LICENSE file for full copyright and licensing details.
+
+from odoo.tests.common import TransactionCase
+
+from odoo.addons.bi_hr_payroll.models.hr_tax_bracket import TaxBrackets
+
+
+class TestTaxBracket(TransactionCase):
+
+    def test_00_pph21_brackets(self):
+        brackets = TaxBrackets(self.env)
+
+        # I check the tax within and across the brackets of the PPh 21 table
+        self.assertEqual(brackets.tax('PPH21', -1000.0), 0.0)
+        self.assertAlmostEqual(brackets.tax('PPH21', 50000000.0), 2500000.0)
+        self.assertAlmostEqual(brackets.tax('PPH21', 100000000.0), 9000000.0)
+        self.assertAlmostEqual(brackets.tax('PPH21', 300000000.0), 44000000.0)
+        self.assertAlmostEqual(brackets.tax('PPH21', 6000000000.0), 1794000000.0)
+
+        # I check the batch evaluation gives the same taxes
+        taxables = [-1000.0, 0.0, 50000000.0, 60000000.0, 100000000.0, 300000000.0, 6000000000.0]
+        for taxable, tax in zip(taxables, brackets.tax_batch('PPH21', taxables)):
+            self.assertAlmostEqual(tax, brackets.tax('PPH21', taxable))
+
+        # I check the PTKP lookup
+        self.assertEqual(brackets.ptkp('K/1'), 63000000.0)
+
+    def test_01_bracket_update(self):
+        table = self.env.ref('bi_hr_payroll.tax_bracket_table_pph21')
+        brackets = TaxBrackets(self.env)
+        self.assertAlmostEqual(brackets.tax('PPH21', 100000000.0), 9000000.0)
+
+        # I change the rate of the first bracket, the cumulative taxes follow
+        table.line_ids.filtered(lambda line: line.lower_bound == 0).rate = 10.0
+        self.assertAlmostEqual(table.line_ids.sorted('lower_bound')[1].cumulative_tax, 6000000.0)
+        self.assertAlmostEqual(brackets.tax('PPH21', 100000000.0), 12000000.0)
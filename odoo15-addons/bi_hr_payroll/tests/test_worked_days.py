@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+# Part of BrowseInfo. See LICENSE file for full copyright and licensing details.
+
+from datetime import datetime, time, timedelta
+
+from pytz import timezone, utc
+
+from bi_hr_payroll.tests.common import TestPayslipBase
+from odoo import fields
+from odoo.addons.bi_hr_payroll.models.hr_payslip import ATTENDANCE_TZ
+
+
+class TestWorkedDaysBatch(TestPayslipBase):
+
+    def setUp(self):
+        super(TestWorkedDaysBatch, self).setUp()
+        # I create a four days week in Brussels, which is not the schedule of the company
+        self.calendar = self.env['resource.calendar'].create({
+            'name': 'Four Days Week',
+            'tz': 'Europe/Brussels',
+            'attendance_ids': [(0, 0, {
+                'name': 'Day %s %s' % (day, hour_from),
+                'dayofweek': str(day),
+                'hour_from': hour_from,
+                'hour_to': hour_to,
+                'day_period': day_period,
+            }) for day in range(4) for hour_from, hour_to, day_period in [(8, 12, 'morning'), (13, 17, 'afternoon')]],
+        })
+        self.assertNotEqual(self.calendar, self.env.company.resource_calendar_id)
+
+        # I create employees on the four days week, and one on the schedule of the company
+        self.employees = self.env['hr.employee'].create([
+            {'name': 'Four Days Employee', 'resource_calendar_id': self.calendar.id},
+            {'name': 'Other Four Days Employee', 'resource_calendar_id': self.calendar.id},
+            {'name': 'Company Schedule Employee'},
+        ])
+        self.contracts = self.env['hr.contract'].create([{
+            'date_start': '2011-01-01',
+            'name': 'Contract of %s' % employee.name,
+            'wage': 3000.0,
+            'employee_id': employee.id,
+            'struct_id': self.developer_pay_structure.id,
+            'resource_calendar_id': employee.resource_calendar_id.id,
+        } for employee in self.employees])
+
+        # I give leaves to the employees: a full day and a half day, and a public holiday of the
+        # four days week
+        leave_type = self.env['hr.leave.type'].create({'name': 'Unpaid Leave', 'requires_allocation': 'no'})
+        leaves = self.env['hr.leave'].create([{
+            'name': 'Leave of %s' % employee.name,
+            'employee_id': employee.id,
+            'holiday_status_id': leave_type.id,
+            'date_from': date_from,
+            'date_to': date_to,
+            'number_of_days': number_of_days,
+        } for employee, date_from, date_to, number_of_days in [
+            (self.employees[0], datetime(2011, 9, 6, 6, 0), datetime(2011, 9, 6, 15, 0), 1.0),
+            (self.employees[0], datetime(2011, 9, 14, 6, 0), datetime(2011, 9, 14, 10, 0), 0.5),
+            (self.employees[2], datetime(2011, 9, 22, 6, 0), datetime(2011, 9, 22, 15, 0), 1.0),
+        ]])
+        leaves.sudo().action_validate()
+        self.env['resource.calendar.leaves'].create({
+            'name': 'Public Holiday',
+            'calendar_id': self.calendar.id,
+            'date_from': datetime(2011, 9, 12, 0, 0),
+            'date_to': datetime(2011, 9, 12, 23, 59),
+        })
+
+    def _get_worked_day_lines_per_contract(self, contracts, date_from, date_to):
+        # the worked days as computed contract by contract before the batch
+        res = []
+        for contract in contracts.filtered(lambda contract: contract.resource_calendar_id):
+            day_from = datetime.combine(fields.Date.from_string(date_from), time.min)
+            day_to = datetime.combine(fields.Date.from_string(date_to), time.max)
+            leaves = {}
+            calendar = contract.resource_calendar_id
+            tz = timezone(calendar.tz)
+            day_leave_intervals = contract.employee_id.list_leaves(day_from, day_to, calendar=contract.resource_calendar_id)
+            for day, hours, leave in day_leave_intervals:
+                holiday = leave[:1].holiday_id
+                current_leave_struct = leaves.setdefault(holiday.holiday_status_id, {
+                    'name': holiday.holiday_status_id.name or 'Global Leaves',
+                    'sequence': 5,
+                    'code': holiday.holiday_status_id.name or 'GLOBAL',
+                    'number_of_days': 0.0,
+                    'number_of_hours': 0.0,
+                    'contract_id': contract.id,
+                })
+                current_leave_struct['number_of_hours'] += hours
+                work_hours = calendar.get_work_hours_count(
+                    tz.localize(datetime.combine(day, time.min)),
+                    tz.localize(datetime.combine(day, time.max)),
+                    compute_leaves=False,
+                )
+                if work_hours:
+                    current_leave_struct['number_of_days'] += hours / work_hours
+            work_data = contract.employee_id._get_work_days_data_batch(day_from, day_to, calendar=contract.resource_calendar_id)
+            res.append({
+                'name': 'Normal Working Days paid at 100%',
+                'sequence': 1,
+                'code': 'WORK100',
+                'number_of_days': work_data[contract.employee_id.id]['days'],
+                'number_of_hours': work_data[contract.employee_id.id]['hours'],
+                'contract_id': contract.id,
+            })
+            res.extend(leaves.values())
+        return res
+
+    def _sorted_lines(self, lines):
+        return sorted((line['contract_id'], line['sequence'], line['code'], line['name'],
+                       round(line['number_of_days'], 6), round(line['number_of_hours'], 6)) for line in lines)
+
+    def test_00_worked_days_parity(self):
+        # I check the worked days of the contracts computed at once are the ones computed contract
+        # by contract
+        batch_lines = self.env['hr.payslip'].get_worked_day_lines(self.contracts, '2011-09-01', '2011-09-30')
+        self.assertEqual(
+            self._sorted_lines(batch_lines),
+            self._sorted_lines(self._get_worked_day_lines_per_contract(self.contracts, '2011-09-01', '2011-09-30')))
+
+        # I check the half day leave counts for half a day, and the public holiday for the employees
+        # of the four days week only
+        leave_days = {
+            (line['contract_id'], line['code']): line['number_of_days'] for line in batch_lines if line['sequence'] == 5
+        }
+        self.assertAlmostEqual(leave_days[(self.contracts[0].id, 'Unpaid Leave')], 1.5)
+        self.assertAlmostEqual(leave_days[(self.contracts[1].id, 'GLOBAL')], 1.0)
+        self.assertNotIn((self.contracts[2].id, 'GLOBAL'), leave_days)
+        self.assertIn((self.contracts[2].id, 'Unpaid Leave'), leave_days)
+
+
+class TestAttendanceDays(TestPayslipBase):
+
+    def test_00_attendance_days_local_midnight(self):
+        # I create check-ins of Richard around the local midnight of the first and the last day of
+        # the period, and one within it
+        check_ins = [
+            datetime(2011, 8, 31, 16, 30), datetime(2011, 8, 31, 17, 30), datetime(2011, 9, 15, 2, 0),
+            datetime(2011, 9, 30, 16, 30), datetime(2011, 9, 30, 17, 30),
+        ]
+        self.env['hr.attendance'].create([{
+            'employee_id': self.richard_emp.id,
+            'check_in': check_in,
+            'check_out': check_in + timedelta(minutes=20),
+        } for check_in in check_ins])
+
+        # I make a rule pay the attendance days
+        rule = self.env['hr.salary.rule'].create({
+            'name': 'Attendance Days',
+            'code': 'ATT',
+            'sequence': 200,
+            'category_id': self.ref('bi_hr_payroll.ALW'),
+            'amount_select': 'code',
+            'amount_python_compute': 'result = worked_days.HADIR.number_of_days',
+        })
+        self.developer_pay_structure.rule_ids = [(4, rule.id)]
+        payslip = self._create_payslip(compute=True)
+
+        # I check the payslip counts the check-ins of the period in local time, as the check-ins
+        # converted one by one to the attendance timezone
+        local_timezone = timezone(ATTENDANCE_TZ)
+        expected = len([
+            check_in for check_in in check_ins
+            if payslip.date_from <= check_in.replace(tzinfo=utc).astimezone(local_timezone).date() <= payslip.date_to
+        ])
+        self.assertEqual(expected, 3)
+        self.assertEqual(payslip._get_attendance_days()[payslip.id][0], expected)
+        self.assertEqual(payslip.line_ids.filtered(lambda line: line.code == 'ATT').total, expected)
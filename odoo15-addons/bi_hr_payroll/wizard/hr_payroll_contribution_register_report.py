@@ -15,6 +15,8 @@ class PayslipLinesContributionRegister(models.TransientModel):
         default=datetime.now().strftime('%Y-%m-01'))
     date_to = fields.Date(string='Date To', required=True,
         default=str(datetime.now() + relativedelta.relativedelta(months=+1, day=1, days=-1))[:10])
+    totals_only = fields.Boolean(string='Totals Only',
+        help="Only print the number of lines and the total of each register, for large periods")
 
     def print_report(self):
         active_ids = self.env.context.get('active_ids', [])
@@ -9,33 +9,80 @@ class HrPayslipEmployees(models.TransientModel):
     _name = 'hr.payslip.employees'
     _description = 'Generate payslips for all selected employees'
 
+    def _default_run_in_background(self):
+        return bool(self.env['ir.config_parameter'].sudo().get_param('bi_hr_payroll.payslip_run_queued'))
+
+    selection_mode = fields.Selection([
+        ('employees', 'Employees'),
+        ('domain', 'Filters'),
+    ], string='Select', required=True, default='employees',
+        help="Pick the employees one by one, or generate the payslips of all the employees matching "
+             "the filters, without loading them in the form.")
     employee_ids = fields.Many2many('hr.employee', 'hr_employee_group_rel', 'payslip_id', 'employee_id', 'Employees')
+    department_ids = fields.Many2many('hr.department', string='Departments',
+        help="Employees of these departments and their sub-departments")
+    company_id = fields.Many2one('res.company', string='Company', default=lambda self: self.env.company)
+    contract_type_id = fields.Many2one('hr.contract.type', string='Contract Type',
+        help="Employees with a running contract of this type")
+    schedule_pay = fields.Selection(lambda self: self.env['hr.contract']._fields['schedule_pay'].selection,
+        string='Scheduled Pay', help="Employees with a running contract paid at this frequency")
+    run_in_background = fields.Boolean(string='Run in Background', default=_default_run_in_background,
+        help="Queue the payslips, computed chunk by chunk by a scheduled action. "
+             "You are notified when the batch is done.")
+
+    def _get_employee_domain(self):
+        self.ensure_one()
+        domain = []
+        if self.company_id:
+            domain.append(('company_id', '=', self.company_id.id))
+        if self.department_ids:
+            domain.append(('department_id', 'child_of', self.department_ids.ids))
+        # the running contract of an employee is their current one, the domain is kept as is by the
+        # chunks of the batch
+        if self.contract_type_id or self.schedule_pay:
+            domain.append(('contract_id.state', '=', 'open'))
+        if self.contract_type_id:
+            domain.append(('contract_id.contract_type_id', '=', self.contract_type_id.id))
+        if self.schedule_pay:
+            domain.append(('contract_id.schedule_pay', '=', self.schedule_pay))
+        return domain
+
+    def _get_employee_chunks(self, payslip_run):
+        """
+        @return: an iterator over the selected employees, by recordsets of the chunk size of the
+                 batch; the employees matching the filters are fetched chunk by chunk
+        """
+        if self.selection_mode != 'domain':
+            yield from payslip_run._split_employees(self.employee_ids)
+            return
+        Employee = self.env['hr.employee']
+        domain = self._get_employee_domain()
+        chunk_size = payslip_run._get_chunk_size()
+        last_id = 0
+        while True:
+            employees = Employee.search(domain + [('id', '>', last_id)], order='id', limit=chunk_size)
+            if not employees:
+                return
+            yield employees
+            last_id = employees[-1].id
 
     def compute_sheet(self):
-        payslips = self.env['hr.payslip']
-        [data] = self.read()
+        self.ensure_one()
         active_id = self.env.context.get('active_id')
         if active_id:
-            [run_data] = self.env['hr.payslip.run'].browse(active_id).read(['date_start', 'date_end', 'credit_note'])
-        from_date = run_data.get('date_start')
-        to_date = run_data.get('date_end')
-        if not data['employee_ids']:
+            payslip_run = self.env['hr.payslip.run'].browse(active_id)
+        if self.selection_mode == 'domain':
+            if not self.env['hr.employee'].search(self._get_employee_domain(), limit=1):
+                raise UserError(_("No employee matches the filters."))
+        elif not self.employee_ids:
             raise UserError(_("You must select employee(s) to generate payslip(s)."))
-        for employee in self.env['hr.employee'].browse(data['employee_ids']):
-            slip_data = self.env['hr.payslip'].onchange_employee_id(from_date, to_date, employee.id, contract_id=False)
-            res = {
-                'employee_id': employee.id,
-                'name': slip_data['value'].get('name'),
-                'struct_id': slip_data['value'].get('struct_id'),
-                'contract_id': slip_data['value'].get('contract_id'),
-                'payslip_run_id': active_id,
-                'input_line_ids': [(0, 0, x) for x in slip_data['value'].get('input_line_ids')],
-                'worked_days_line_ids': [(0, 0, x) for x in slip_data['value'].get('worked_days_line_ids')],
-                'date_from': from_date,
-                'date_to': to_date,
-                'credit_note': run_data.get('credit_note'),
-                'company_id': employee.company_id.id,
-            }
-            payslips += self.env['hr.payslip'].create(res)
-        payslips.with_context(value=True).compute_sheet()
+        employee_chunks = self._get_employee_chunks(payslip_run)
+        workers = int(self.env['ir.config_parameter'].sudo().get_param('bi_hr_payroll.payslip_run_workers', 0))
+        if self.run_in_background or workers:
+            # committed chunk by chunk by the scheduled action, failed chunks can be retried from the batch
+            domain = self._get_employee_domain() if self.selection_mode == 'domain' else None
+            payslip_run._enqueue_chunks(employee_chunks, domain=domain)
+        else:
+            for employees in employee_chunks:
+                payslip_run._generate_payslips_chunk(employees)
         return {'type': 'ir.actions.act_window_close'}